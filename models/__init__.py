@@ -3,9 +3,12 @@ from .article import (
     Article,
 )
 from .article_relationship import ArticleRelationship
+from .article_search import ArticleQuerySet, ArticleUPC
 from .cm import CM
+from .competitor_price import CompetitorPrice
 from .competitor_sku import CompetitorSKU
 from .competitor_weighting import CompetitorWeighting
+from .dimensions import CanonicalDimensionsMixin, CanonicalDimensionsQuerySet
 from .dmm import DMM
 from .file_upload_task import FileUploadTask, UploadedFileCategory
 from .gmm import GMM
@@ -15,6 +18,11 @@ from .managers import ScenarioScopeZoneDetailsManager
 from .markdown_actual import (
     MarkdownScenarioActualSales,
 )
+from .markdown_discount import DiscountNotchSnapper, PriceRoundingRuleIndex
+from .markdown_effective_price import (
+    MarkdownPriceSource,
+    MarkdownScenarioEffectivePrice,
+)
 from .markdown_event import (
     MarkdownEvent,
     MarkdownEventStatus,
@@ -24,12 +32,15 @@ from .markdown_event import (
     MarkdownArticleGroupType,
     MarkdownEventType,
 )
+from .markdown_kpi import MarkdownScenarioKPI
 from .markdown_price import (
     MarkdownScenarioPrice,
     MarkdownScenarioRecommendedPrice,
     MarkdownScenarioPlannedPrice,
     MarkdownScenarioClusterPlannedPrice,
 )
+from .markdown_read_and_react import MarkdownScenarioReadAndReactSummary
+from .markdown_results import MarkdownResultsLoader
 from .markdown_scenario import (
     MarkdownScenarioStatus,
     MarkdownScenario,
@@ -42,16 +53,26 @@ from .markdown_scenario import (
     MarkdownScenarioOptimizeForEcommerce,
 )
 from .markdown_scope_deletion import MarkdownStoreScopeDeletion
+from .markdown_store_cluster import MarkdownScenarioStoreCluster
+from .master_data_sync import (
+    MasterDataSync,
+    MasterDataSyncResult,
+    master_data_changed,
+)
 from .mdse_div import MerchDivision
-from .min_advertised_price import MinimumAdvertisedPrice
-from .mixins import TimeStampMixin
+from .merch_hierarchy import MerchHierarchyClosure, MerchHierarchyLevel
+from .merch_hierarchy_cache import MerchHierarchyCache, merch_hierarchy
+from .min_advertised_price import MAPChecker, MinimumAdvertisedPrice
+from .mixins import ContentHashMixin, TimeStampMixin
 from .nbob_pair import NBOBPair
 from .nbob_role import NBOBRole
 from .opstudy import OpStudy
 from .opstudy_role import OpStudyRole
+from .parsed_upload_cache import ParsedUploadCache
 from .plg import PLG
 from .ppu import PPU
 from .price_rounding_rule import PriceRoundingRule
+from .pricing_comparison import PricingScenarioComparison
 from .pricing_cost import PricingCost
 from .pricing_price import (
     PricingScenarioPrice,
@@ -61,6 +82,12 @@ from .pricing_price import (
     PricingCMPlannedPrice,
     PricingRecommendedPrice,
 )
+from .pricing_price_family import (
+    PriceFamilyChecker,
+    PricingPriceSource,
+    pricing_effective_price_params,
+    pricing_effective_price_sql,
+)
 from .pricing_scenario import (
     PricingScenario,
     PriceIndexTarget,
@@ -69,7 +96,16 @@ from .pricing_scenario import (
     ScenarioScopeZoneDetails,
 )
 from .prod_cat import ProductCategory
+from .reference_data_version import ReferenceDataVersion
 from .role_kvi_index_range import RoleKVIIndexRange
-from .store_zone import StoreZone
+from .scenario_run import ScenarioRun, ScenarioRunStatus, ScenarioRunType
+from .scenario_scheduler import (
+    FakeOptimizerRunner,
+    ScenarioRunner,
+    ScenarioScheduler,
+)
+from .scope_upload import ParsedScopeFile, ScopeFileValidator
+from .scope_upload_apply import ScopeUploadApplier
+from .store_zone import StoreZone, StoreZoneCache, store_zones
 from .zone import Zone
 from .zone_differential import ZoneDifferential
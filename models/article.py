@@ -1,11 +1,13 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models.functions import Upper
 
-from bulk_update_or_create import BulkUpdateOrCreateQuerySet
-from core.models.mixins import TimeStampMixin
+from core.models.article_search import ArticleQuerySet
+from core.models.mixins import ContentHashMixin, TimeStampMixin
 
 
-class Article(TimeStampMixin, models.Model):
-    objects = BulkUpdateOrCreateQuerySet.as_manager()
+class Article(ContentHashMixin, TimeStampMixin, models.Model):
+    objects = ArticleQuerySet.as_manager()
 
     # SAP article id, New article id
     article_id = models.IntegerField(blank=True, null=True)
@@ -103,4 +105,13 @@ class Article(TimeStampMixin, models.Model):
             models.Index(fields=["is_master"]),
             models.Index(fields=["article_id"]),
             models.Index(fields=["pln"]),
+            # Trigram indexes on the expressions Django's case-insensitive
+            # lookups compare, for ArticleQuerySet.search (needs pg_trgm).
+            *(
+                GinIndex(
+                    OpClass(Upper(field), name="gin_trgm_ops"),
+                    name=f"article_{field}_trgm",
+                )
+                for field in ("pln", "description", "brand", "vendor_name")
+            ),
         ]
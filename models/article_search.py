@@ -0,0 +1,253 @@
+import logging
+import re
+
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connection, models, transaction
+from django.db.models import Case, Count, FloatField, Q, Value, When
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_save
+
+from bulk_update_or_create import BulkUpdateOrCreateQuerySet
+from core import models as cm
+from core.models.bulk import qn
+
+logger = logging.getLogger(__name__)
+
+HIERARCHY = ("opstudy", "gmm", "dmm", "cm", "mdse_div", "prod_cat")
+
+# Trigram similarity is meaningless below three characters.
+MIN_TRIGRAM_LENGTH = 3
+
+
+def normalize_upc(value):
+    """
+    UPCs are compared on their digits only, so "0-12345 67890" and
+    12345678900 in a feed match the same article.
+    """
+    return re.sub(r"\D", "", str(value)) if value is not None else ""
+
+
+class ArticleQuerySet(BulkUpdateOrCreateQuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        created = super().bulk_create(objs, *args, **kwargs)
+        plns = [o.pln for o in created]
+        cm.ArticleUPC.objects.sync(
+            self.filter(pln__in=plns).values_list("id", flat=True)
+        )
+        cm.MinimumAdvertisedPrice.objects.link_articles(plns)
+        return created
+
+    def bulk_update_or_create(self, objs, update_fields, match_field="pk", **kwargs):
+        """
+        Upsert articles, then resync the UPC rows and MAP links of every
+        upserted article.
+        """
+        objs = list(objs)
+        result = super().bulk_update_or_create(
+            objs, update_fields, match_field=match_field, **kwargs
+        )
+        if kwargs.get("yield_objects"):
+            result = list(result)
+        if objs:
+            keys = [getattr(o, match_field) for o in objs]
+            upserted = self.filter(**{f"{match_field}__in": keys})
+            cm.ArticleUPC.objects.sync(upserted.values_list("id", flat=True))
+            cm.MinimumAdvertisedPrice.objects.link_articles(
+                upserted.values_list("pln", flat=True)
+            )
+        return result
+
+    def _matching_upcs(self, digits, prefix):
+        upcs = cm.ArticleUPC.objects.filter(
+            **{"upc__startswith" if prefix else "upc": digits}
+        )
+        return upcs.values("article_id")
+
+    def search(self, term, limit=50):
+        """
+        Articles matching `term` on pln, UPC, description, brand or vendor
+        name, best matches first, with their hierarchy selected. Exact pln and
+        UPC matches rank above prefix matches, which rank above fuzzy text
+        matches.
+        """
+        term = term.strip()
+        if not term:
+            return self.none()
+        digits = normalize_upc(term)
+
+        matches = Q(pln__istartswith=term)
+        exact = [When(pln__iexact=term, then=Value(3.0))]
+        if digits:
+            matches |= Q(id__in=self._matching_upcs(digits, prefix=True))
+            exact.append(
+                When(id__in=self._matching_upcs(digits, prefix=False), then=Value(3.0))
+            )
+        similarity = Value(0.0)
+        if len(term) >= MIN_TRIGRAM_LENGTH:
+            matches |= (
+                Q(description__icontains=term)
+                | Q(brand__icontains=term)
+                | Q(vendor_name__icontains=term)
+            )
+            similarity = Greatest(
+                TrigramWordSimilarity(term, "description"),
+                TrigramWordSimilarity(term, "brand"),
+                TrigramWordSimilarity(term, "vendor_name"),
+            )
+
+        return (
+            self.filter(matches)
+            .annotate(
+                rank=Case(
+                    *exact,
+                    When(pln__istartswith=term, then=Value(2.0)),
+                    default=Value(0.0),
+                    output_field=FloatField(),
+                )
+                + similarity
+            )
+            .select_related(*HIERARCHY)
+            .order_by("-rank", "pln")[:limit]
+        )
+
+    def typeahead(self, prefix, limit=10):
+        """
+        Lightweight suggestions for a partially typed pln, UPC or description.
+        """
+        prefix = prefix.strip()
+        if not prefix:
+            return self.none()
+        matches = Q(pln__istartswith=prefix)
+        digits = normalize_upc(prefix)
+        if digits == prefix:
+            matches |= Q(id__in=self._matching_upcs(digits, prefix=True))
+        if len(prefix) >= MIN_TRIGRAM_LENGTH:
+            matches |= Q(description__istartswith=prefix)
+        return self.filter(matches).order_by("pln").values(
+            "id", "pln", "description", "brand"
+        )[:limit]
+
+
+class ArticleUPCManager(models.Manager):
+    def sync(self, article_ids):
+        """
+        Rebuild the UPC rows of the given articles and report the UPCs they
+        now share with other articles.
+        """
+        article_ids = list(article_ids)
+        if not article_ids:
+            return []
+        with transaction.atomic():
+            self.rebuild(article_ids)
+            conflicts = self.conflicts(
+                self.filter(article_id__in=article_ids).values("upc")
+            )
+        if conflicts:
+            logger.warning(
+                "%s UPCs map to several articles, e.g. %s",
+                len(conflicts),
+                conflicts[0],
+            )
+        return conflicts
+
+    def conflicts(self, upcs=None):
+        """
+        UPCs mapped to more than one article, optionally restricted to
+        `upcs`, as dicts of the UPC and the plns sharing it.
+        """
+        qs = self.all()
+        if upcs is not None:
+            qs = qs.filter(upc__in=upcs)
+        return list(
+            qs.values("upc")
+            .annotate(n=Count("article_id"), plns=ArrayAgg("article__pln"))
+            .filter(n__gt=1)
+            .order_by("upc")
+            .values("upc", "plns")
+        )
+
+    def resolve(self, upcs):
+        """
+        Map a batch of UPCs, as they appear in a feed, to article ids in one
+        round trip. UPCs shared by several articles resolve to the SRL master,
+        then to the lowest article id; unknown UPCs are left out.
+        """
+        normalized = {}
+        for upc in upcs:
+            normalized.setdefault(normalize_upc(upc), []).append(upc)
+        normalized.pop("", None)
+        if not normalized:
+            return {}
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT DISTINCT ON (u.upc) u.upc, u.article_id "
+                f"FROM unnest(%s::text[]) q(upc) "
+                f"JOIN {qn(self.model._meta.db_table)} u ON u.upc = q.upc "
+                f"JOIN {qn(cm.Article._meta.db_table)} a ON a.id = u.article_id "
+                "ORDER BY u.upc, a.is_master DESC, a.id",
+                [list(normalized)],
+            )
+            return {
+                original: article_id
+                for upc, article_id in cursor.fetchall()
+                for original in normalized[upc]
+            }
+
+    def rebuild(self, article_ids=None):
+        """
+        Rederive the UPC rows of the given articles (all articles by default)
+        from their `upc` JSON lists in one statement.
+        """
+        table = qn(self.model._meta.db_table)
+        articles = qn(cm.Article._meta.db_table)
+        where, params = "", []
+        if article_ids is not None:
+            where, params = "WHERE a.id = ANY(%s)", [list(article_ids)]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {table} "
+                + ("WHERE article_id = ANY(%s)" if article_ids is not None else ""),
+                params,
+            )
+            cursor.execute(
+                f"INSERT INTO {table} (article_id, upc) "
+                "SELECT DISTINCT a.id, u.upc FROM ("
+                "SELECT a.id, regexp_replace(e.value, '\\D', '', 'g') AS upc "
+                f"FROM {articles} a, jsonb_array_elements_text("
+                "CASE jsonb_typeof(a.upc) WHEN 'array' THEN a.upc "
+                "ELSE '[]'::jsonb END) e "
+                f"{where}) u WHERE u.upc <> ''",
+                params,
+            )
+            return cursor.rowcount
+
+
+class ArticleUPC(models.Model):
+    """
+    One row per UPC of an `Article`, normalized from `Article.upc` for
+    indexed lookups.
+    """
+
+    objects = ArticleUPCManager()
+
+    article = models.ForeignKey(
+        "core.Article", on_delete=models.CASCADE, related_name="upcs"
+    )
+    # Indexed for equality and, through varchar_pattern_ops, prefix lookups.
+    upc = models.CharField(max_length=20, db_index=True)
+
+    def __str__(self):
+        return self.upc
+
+    class Meta:
+        unique_together = ("article", "upc")
+
+
+def _sync_article_upcs(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and "upc" not in update_fields:
+        return
+    ArticleUPC.objects.sync([instance.pk])
+
+
+post_save.connect(_sync_article_upcs, sender="core.Article", weak=False)
@@ -0,0 +1,82 @@
+import csv
+import io
+
+from django.db import connection, transaction
+
+
+def qn(name):
+    return connection.ops.quote_name(name)
+
+
+def defer_on_commit(callback_class, items):
+    """
+    Collect `items` into the single `callback_class` instance registered with
+    `transaction.on_commit` in the current transaction, so work triggered by
+    many row writes runs once at commit. Outside a transaction the callback
+    runs immediately.
+    """
+    conn = transaction.get_connection()
+    if conn.in_atomic_block:
+        for entry in conn.run_on_commit:
+            if isinstance(entry[1], callback_class):
+                entry[1].add(items)
+                return
+    callback = callback_class()
+    callback.add(items)
+    transaction.on_commit(callback)
+
+
+def create_staging_table(cursor, name, source_table, columns):
+    """
+    Create a session-local staging table holding `columns` of `source_table`.
+    Only the column types are copied; constraints and defaults are left behind
+    so partial rows can be streamed in and validated before they touch the
+    real table. The table is dropped when the surrounding transaction ends.
+    """
+    cursor.execute(
+        f"CREATE TEMPORARY TABLE {qn(name)} ON COMMIT DROP AS "
+        f"SELECT {', '.join(qn(c) for c in columns)} "
+        f"FROM {qn(source_table)} WITH NO DATA"
+    )
+
+
+def read_csv_header(stream):
+    """
+    Read the header line of a CSV text stream, leaving the stream positioned
+    at the first data row.
+    """
+    return next(csv.reader([stream.readline()]))
+
+
+def copy_csv(cursor, table, columns, stream):
+    """
+    Stream CSV rows (without header) from a text file object into `table`
+    using COPY. Rows never pass through Python objects.
+    """
+    cursor.copy_expert(
+        f"COPY {qn(table)} ({', '.join(qn(c) for c in columns)}) "
+        "FROM STDIN WITH (FORMAT csv)",
+        stream,
+    )
+
+
+def copy_rows(cursor, table, columns, rows, batch_size=50000):
+    """
+    Stream an iterable of tuples into `table` using COPY, buffering at most
+    `batch_size` rows in memory at a time.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    count = 0
+    for row in rows:
+        writer.writerow(["" if value is None else value for value in row])
+        count += 1
+        if count % batch_size == 0:
+            buffer.seek(0)
+            copy_csv(cursor, table, columns, buffer)
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        buffer.seek(0)
+        copy_csv(cursor, table, columns, buffer)
+    return count
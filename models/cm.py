@@ -1,10 +1,10 @@
 from bulk_update_or_create import BulkUpdateOrCreateQuerySet
 from django.db import models
 
-from core.models.mixins import TimeStampMixin
+from core.models.mixins import ContentHashMixin, TimeStampMixin
 
 
-class CM(TimeStampMixin, models.Model):
+class CM(ContentHashMixin, TimeStampMixin, models.Model):
     """
     Category manager
     """
@@ -0,0 +1,145 @@
+from django.db import connection, models, transaction
+
+from core import models as cm
+from core.models.bulk import copy_csv, copy_rows, create_staging_table, qn
+
+COLUMNS = [
+    "competitor_sku_id",
+    "zone_id",
+    "date",
+    "price",
+    "price_api",
+    "units",
+    "units_api",
+]
+KEY_COLUMNS = ["competitor_sku_id", "zone_id", "date"]
+STAGING_TABLE = "competitor_price_staging"
+
+# ScenarioScopeZoneDetails field prefix -> competitor name column of
+# CompetitorWeighting.
+COMPETITOR_FIELDS = {
+    "primary_comp": "primary_competitor_name",
+    "secondary_comp": "secondary_competitor_name",
+}
+
+
+class CompetitorPriceManager(models.Manager):
+    def ingest(self, rows=None, stream=None):
+        """
+        Upsert observations given either as tuples in `COLUMNS` order or as a
+        headerless CSV text stream in the same order. Rows are staged with
+        COPY and merged in one statement; unchanged observations are not
+        rewritten, and of repeated keys the last row is kept. Returns the
+        number of rows inserted or updated.
+        """
+        table = qn(self.model._meta.db_table)
+        values = [c for c in COLUMNS if c not in KEY_COLUMNS]
+        with transaction.atomic(), connection.cursor() as cursor:
+            create_staging_table(
+                cursor, STAGING_TABLE, self.model._meta.db_table, COLUMNS
+            )
+            if stream is not None:
+                copy_csv(cursor, STAGING_TABLE, COLUMNS, stream)
+            else:
+                copy_rows(cursor, STAGING_TABLE, COLUMNS, rows)
+            cursor.execute(
+                f"INSERT INTO {table} ({', '.join(COLUMNS)}) "
+                f"SELECT DISTINCT ON ({', '.join(KEY_COLUMNS)}) "
+                f"{', '.join(COLUMNS)} FROM {qn(STAGING_TABLE)} "
+                # The staging table is only appended to, so ctid follows load
+                # order: the last of several observations of a key wins.
+                f"ORDER BY {', '.join(KEY_COLUMNS)}, ctid DESC "
+                f"ON CONFLICT ({', '.join(KEY_COLUMNS)}) DO UPDATE SET "
+                + ", ".join(f"{c} = excluded.{c}" for c in values)
+                + f" WHERE ({', '.join(f'{table}.{c}' for c in values)}) "
+                f"IS DISTINCT FROM ({', '.join('excluded.' + c for c in values)})"
+            )
+            return cursor.rowcount
+
+    def fill_zone_details(self, scenario, as_of):
+        """
+        Set the primary and secondary competitor price, API price and units of
+        every `ScenarioScopeZoneDetails` row of a pricing scenario to the
+        latest observation on or before `as_of`, in one UPDATE.
+
+        Competitors are picked like `ScenarioScopeZoneDetails.objects` does:
+        the `CompetitorWeighting` of the article's opstudy for the zone, else
+        the one for "all" zones. Scope-zones without an observation get NULLs.
+        """
+        details = qn(cm.ScenarioScopeZoneDetails._meta.db_table)
+        scope = qn(cm.PricingScenarioScope._meta.db_table)
+        article = qn(cm.Article._meta.db_table)
+        weighting = qn(cm.CompetitorWeighting._meta.db_table)
+        sku = qn(cm.CompetitorSKU._meta.db_table)
+        prices = qn(self.model._meta.db_table)
+
+        competitors = ", ".join(
+            f"coalesce((SELECT w.{name} FROM {weighting} w "
+            "WHERE w.opstudy_id = a.opstudy_id AND w.zone_ref_id = z.zone_id "
+            f"AND w.{name} IS NOT NULL LIMIT 1), "
+            f"(SELECT w.{name} FROM {weighting} w "
+            "WHERE w.opstudy_id = a.opstudy_id AND w.zone = 'all' "
+            f"LIMIT 1)) AS {prefix}"
+            for prefix, name in COMPETITOR_FIELDS.items()
+        )
+        observations = " ".join(
+            f"LEFT JOIN LATERAL (SELECT p.price, p.price_api, p.units, "
+            f"p.units_api FROM {prices} p JOIN {sku} k "
+            "ON k.id = p.competitor_sku_id "
+            f"WHERE k.article_id = s.article_id AND k.competitor_name = c.{prefix} "
+            "AND p.zone_id = z.zone_id AND p.date <= %s "
+            f"ORDER BY p.date DESC, p.id DESC LIMIT 1) {prefix} ON true"
+            for prefix in COMPETITOR_FIELDS
+        )
+        fields = {
+            f"{prefix}_{target}": f"{prefix}.{source}"
+            for prefix in COMPETITOR_FIELDS
+            for target, source in (
+                ("price", "price"),
+                ("price_api", "price_api"),
+                ("units", "units"),
+                ("units_api", "units_api"),
+            )
+        }
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {details} t SET "
+                + ", ".join(f"{field} = x.{field}" for field in fields)
+                + ", updated_at = now() FROM (SELECT z.id, "
+                + ", ".join(f"{source} AS {field}" for field, source in fields.items())
+                + f" FROM {details} z "
+                f"JOIN {scope} s ON s.id = z.pricingscenarioscope_id "
+                f"JOIN {article} a ON a.id = s.article_id "
+                f"CROSS JOIN LATERAL (SELECT {competitors}) c {observations} "
+                "WHERE s.scenario_id = %s) x WHERE t.id = x.id "
+                f"AND ({', '.join('t.' + f for f in fields)}) IS DISTINCT FROM "
+                f"({', '.join('x.' + f for f in fields)})",
+                [as_of] * len(COMPETITOR_FIELDS) + [getattr(scenario, "id", scenario)],
+            )
+            return cursor.rowcount
+
+
+class CompetitorPrice(models.Model):
+    """Hold competitor price observations per competitor SKU, zone and date"""
+
+    objects = CompetitorPriceManager()
+
+    competitor_sku = models.ForeignKey(
+        "core.CompetitorSKU",
+        on_delete=models.CASCADE,
+        related_name="prices",
+    )
+    zone = models.ForeignKey(
+        "core.Zone",
+        on_delete=models.CASCADE,
+    )
+    date = models.DateField()
+    price = models.DecimalField(decimal_places=2, max_digits=10, null=True)
+    price_api = models.DecimalField(decimal_places=2, max_digits=10, null=True)
+    units = models.FloatField(null=True)
+    units_api = models.FloatField(null=True)
+
+    class Meta:
+        # Also serves the latest-observation-as-of lookups.
+        unique_together = ("competitor_sku", "zone", "date")
+        ordering = ["id"]
@@ -12,3 +12,6 @@ class CompetitorSKU(models.Model):
     own_brand = models.BooleanField(default=False)
     target_id = models.CharField(max_length=50)
     competitor_name = models.CharField(max_length=100)
+
+    class Meta:
+        indexes = [models.Index(fields=["article", "competitor_name"])]
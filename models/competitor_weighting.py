@@ -1,7 +1,11 @@
 from django.db import models
 
+from core.models.dimensions import CanonicalDimensionsMixin
 
-class CompetitorWeighting(models.Model):
+
+class CompetitorWeighting(CanonicalDimensionsMixin, models.Model):
+    canonical_dimensions = ("zone",)
+    dimension_refs = {"zone": "Zone"}
 
     opstudy = models.ForeignKey(
         "core.OpStudy",
@@ -24,3 +28,18 @@ class CompetitorWeighting(models.Model):
         null=True,
         blank=True,
     )
+
+    # Typed `zone`, NULL for `all`; set on save.
+    zone_ref = models.ForeignKey(
+        "core.Zone",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["opstudy", "zone_ref"]),
+            models.Index(fields=["opstudy", "zone"]),
+        ]
@@ -0,0 +1,153 @@
+from django.apps import apps as django_apps
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.db.models import CharField, OuterRef, Subquery
+from django.db.models.functions import Cast, Lower, Trim
+
+from core import models as cm
+
+# Matches every opstudy or zone in target and weighting tables.
+WILDCARD = "all"
+
+
+def canonical(value):
+    """
+    Canonical form of a string dimension (kvi_class, promo_status, zone, ...):
+    stripped and lowercased, so lookups can use plain equality.
+    """
+    return str(value).strip().lower() if value is not None else None
+
+
+def reference_id(value):
+    """
+    Id held by an opstudy or zone dimension string, None for the wildcard.
+    Raises ValueError for anything else.
+    """
+    value = canonical(value)
+    if not value or value == WILDCARD:
+        return None
+    if not value.isdigit():
+        raise ValueError(f"{value} is neither an id nor {WILDCARD!r}")
+    return int(value)
+
+
+def _reference_key(model, name):
+    """Column of the referenced model held by the `<name>_ref` foreign key"""
+    return model._meta.get_field(f"{name}_ref").target_field.attname
+
+
+def _canonical_values(model, get_model):
+    """
+    UPDATE values canonicalizing the dimensions of `model` and setting its
+    typed references, NULL where the referenced row does not exist.
+    """
+    values = {name: Lower(Trim(name)) for name in model.canonical_dimensions}
+    for name, referenced in model.dimension_refs.items():
+        key = _reference_key(model, name)
+        values[f"{name}_ref"] = Subquery(
+            get_model(referenced)
+            .objects.annotate(text=Cast(key, CharField()))
+            .filter(text=Lower(Trim(OuterRef(name))))
+            .values(key)[:1]
+        )
+    return values
+
+
+def canonicalize_dimensions(apps, schema_editor):
+    """
+    Backfill every model using `CanonicalDimensionsMixin`. Intended to be run
+    from a `RunPython` data migration once the `_ref` columns exist.
+    """
+    for model in django_apps.get_app_config("core").get_models():
+        if issubclass(model, CanonicalDimensionsMixin):
+            historical = apps.get_model("core", model.__name__)
+            historical.objects.update(
+                **_canonical_values(model, lambda name: apps.get_model("core", name))
+            )
+
+
+class CanonicalDimensionsQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        self.model.canonicalize_objects(objs)
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        self.model.canonicalize_objects(objs)
+        fields = list(fields) + [
+            f"{name}_ref"
+            for name in self.model.dimension_refs
+            if name in fields and f"{name}_ref" not in fields
+        ]
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+    def canonicalize(self):
+        """
+        Backfill rows written before dimensions were canonicalized: normalize
+        the strings and set the typed references in one UPDATE. Fails on rows
+        that only differed by case or whitespace, which must be merged first.
+        """
+        return self.update(
+            **_canonical_values(self.model, lambda name: getattr(cm, name))
+        )
+
+
+class CanonicalDimensionsMixin(models.Model):
+    """
+    Canonicalize `canonical_dimensions` on save and derive a typed `<name>_ref`
+    for each of `dimension_refs` (dimension name -> referenced model name),
+    left NULL for the "all" wildcard. References to missing rows raise a
+    ValidationError.
+    """
+
+    canonical_dimensions = ()
+    dimension_refs = {}
+
+    objects = CanonicalDimensionsQuerySet.as_manager()
+
+    @classmethod
+    def canonicalize_objects(cls, objs):
+        """
+        Canonicalize the dimensions of `objs`, checking their references with
+        one query per referenced model.
+        """
+        errors = []
+        for obj in objs:
+            for name in cls.canonical_dimensions:
+                setattr(obj, name, canonical(getattr(obj, name)))
+        for name, referenced in cls.dimension_refs.items():
+            refs = []
+            for obj in objs:
+                try:
+                    refs.append((obj, reference_id(getattr(obj, name))))
+                except ValueError as e:
+                    errors.append(f"{name}: {e}")
+                    refs.append((obj, None))
+            key = _reference_key(cls, name)
+            known = set(
+                getattr(cm, referenced)
+                .objects.filter(**{f"{key}__in": {ref for _, ref in refs} - {None}})
+                .values_list(key, flat=True)
+            )
+            for obj, ref in refs:
+                if ref is not None and ref not in known:
+                    errors.append(f"{name}: unknown {referenced} {ref}")
+                setattr(obj, f"{name}_ref_id", ref)
+        if errors:
+            raise ValidationError(errors)
+
+    def canonicalize_dimensions(self):
+        self.canonicalize_objects([self])
+
+    def save(self, *args, **kwargs):
+        self.canonicalize_dimensions()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = set(update_fields) | {
+                f"{name}_ref" for name in self.dimension_refs if name in update_fields
+            }
+        super().save(*args, **kwargs)
+
+    class Meta:
+        abstract = True
@@ -1,7 +1,50 @@
+import hashlib
+import io
+import mmap
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
 from django.db import models
+from django.utils.module_loading import import_string
+
 from core.models import mixins as core_mixins
 
 
+def upload_storage():
+    """
+    Storage backend for uploaded payloads. Configure with the
+    `FILE_UPLOAD_TASK_STORAGE` setting (dotted path to a Storage class),
+    defaults to the project's default (local filesystem) storage.
+    """
+    path = getattr(settings, "FILE_UPLOAD_TASK_STORAGE", None)
+    return import_string(path)() if path else default_storage
+
+
+class _HashingReader:
+    """Hash a binary stream while the storage backend reads it in chunks"""
+
+    def __init__(self, stream, size=None):
+        self.stream = stream
+        self.hash = hashlib.sha256()
+        self.bytes_read = 0
+        # Backends may need the total size (e.g. as Content-Length) before
+        # reading; fall back to the size of the underlying file.
+        if size is None:
+            try:
+                size = File(stream).size
+            except (AttributeError, OSError):
+                size = None
+        self.size = size
+
+    def read(self, size=-1):
+        chunk = self.stream.read(size)
+        self.hash.update(chunk)
+        self.bytes_read += len(chunk)
+        return chunk
+
+
 class UploadedFileCategory(models.TextChoices):
     MARKDOWNEVENTSCOPE = "MARKDOWNEVENTSCOPE"
     PRICINGSCENARIOSCOPE = "PRICINGSCENARIOSCOPE"
@@ -13,7 +56,14 @@ class UploadTaskStatus(models.TextChoices):
     DONE = "DONE"
 
 
+class FileUploadTaskManager(models.Manager):
+    def get_queryset(self):
+        # Legacy in-row payloads are only loaded by `open_content`.
+        return super().get_queryset().defer("content_binary")
+
+
 class FileUploadTask(core_mixins.TimeStampMixin, models.Model):
+    objects = FileUploadTaskManager()
 
     file_name = models.CharField(
         max_length=100,
@@ -25,10 +75,21 @@ class FileUploadTask(core_mixins.TimeStampMixin, models.Model):
         null=True,
         blank=True,
     )
+    # Legacy in-row payload, superseded by `content_file`.
     content_binary = models.BinaryField(
         null=True,
         blank=True,
     )
+    content_file = models.FileField(
+        upload_to="file_upload_tasks/%Y/%m/%d",
+        storage=upload_storage,
+        max_length=255,
+        null=True,
+        blank=True,
+    )
+    # sha256 of the payload
+    content_hash = models.CharField(max_length=64, blank=True, default="")
+    content_size = models.BigIntegerField(null=True, blank=True)
     validation = models.JSONField(
         null=True,
         blank=True,
@@ -57,3 +118,53 @@ class FileUploadTask(core_mixins.TimeStampMixin, models.Model):
         null=True,
         blank=True,
     )
+
+    def store_content(self, stream, name=None, size=None):
+        """
+        Stream a binary file object to the storage backend in chunks, keeping
+        only its reference, size and hash on the task. Pass `size` when it is
+        known upfront (e.g. `UploadedFile.size`) and the stream is not seekable.
+        """
+        reader = _HashingReader(stream, size)
+        self.content_file.save(
+            name or self.file_name or "upload", File(reader), save=False
+        )
+        self.content_hash = reader.hash.hexdigest()
+        self.content_size = reader.bytes_read
+        self.content_binary = None
+        self.save()
+
+    def open_content(self):
+        """
+        Binary file object over the payload, wherever it is stored.
+        """
+        if self.content_file:
+            return self.content_file.open("rb")
+        payload = FileUploadTask.objects.values_list("content_binary", flat=True).get(
+            pk=self.pk
+        )
+        return io.BytesIO(bytes(payload or b""))
+
+    @contextmanager
+    def map_content(self):
+        """
+        Read-only memory map of the payload when it lives on the local
+        filesystem, otherwise the payload bytes.
+        """
+        try:
+            path = self.content_file.path if self.content_file else None
+        except NotImplementedError:
+            path = None
+        if path is None:
+            with self.open_content() as stream:
+                yield stream.read()
+            return
+        with open(path, "rb") as stream:
+            if self.content_size == 0:
+                yield b""
+                return
+            with mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                yield mapped
+
+    class Meta:
+        indexes = [models.Index(fields=["content_hash"])]
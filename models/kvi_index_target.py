@@ -1,7 +1,18 @@
 from django.db import models
 
+from core.models.dimensions import CanonicalDimensionsMixin
 
-class KVIIndexTarget(models.Model):
+
+class KVIIndexTarget(CanonicalDimensionsMixin, models.Model):
+    canonical_dimensions = (
+        "opstudy",
+        "zone",
+        "kvi_class",
+        "primary_secondary",
+        "promo_status",
+        "competitor_type",
+    )
+    dimension_refs = {"opstudy": "OpStudy", "zone": "Zone"}
 
     # opstudy and zone can be `all` value
     opstudy = models.CharField(max_length=20)
@@ -13,6 +24,23 @@ class KVIIndexTarget(models.Model):
     index_min = models.IntegerField(null=True, blank=True)
     index_max = models.IntegerField(null=True, blank=True)
 
+    # Typed `opstudy` and `zone`, NULL for `all`; set on save.
+    opstudy_ref = models.ForeignKey(
+        "core.OpStudy",
+        on_delete=models.CASCADE,
+        to_field="opstudy_id",
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    zone_ref = models.ForeignKey(
+        "core.Zone",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+
     class Meta:
         unique_together = (
             "opstudy",
@@ -22,3 +50,15 @@ class KVIIndexTarget(models.Model):
             "competitor_type",
             "primary_secondary",
         )
+        indexes = [
+            models.Index(
+                fields=[
+                    "opstudy_ref",
+                    "zone_ref",
+                    "kvi_class",
+                    "promo_status",
+                    "primary_secondary",
+                    "competitor_type",
+                ]
+            ),
+        ]
@@ -1,7 +1,10 @@
 from django.db import models
 
+from core.models.dimensions import CanonicalDimensionsMixin
 
-class KVIPromoStatus(models.Model):
+
+class KVIPromoStatus(CanonicalDimensionsMixin, models.Model):
+    canonical_dimensions = ("kvi_class", "promo_status")
 
     article = models.OneToOneField(
         "core.Article",
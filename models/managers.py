@@ -12,10 +12,9 @@ from django.db.models import (
     Window,
     Q,
     Avg,
-    CharField,
     BooleanField,
 )
-from django.db.models.functions import Cast, NullIf
+from django.db.models.functions import Lower, NullIf
 from django.db.models.lookups import GreaterThan, LessThan
 
 from core import models as cm
@@ -451,30 +450,26 @@ class ScenarioScopeZoneDetailsManager(Manager):
         First search for a specific match by zone, and if none are found, search on
         all zones.
         """
-        outer_zone = Cast(OuterRef("zone"), output_field=CharField())
         query = cm.CompetitorWeighting.objects.filter(
             opstudy=OuterRef("pricingscenarioscope__article__opstudy_id"),
         )
+        zone_query = query.filter(zone_ref=OuterRef("zone"))
 
         return qs.alias(
-            primary=query.filter(zone=outer_zone).values("primary_competitor_name"),
-            secondary=query.filter(zone=outer_zone).values("secondary_competitor_name"),
+            primary=zone_query.values("primary_competitor_name"),
+            secondary=zone_query.values("secondary_competitor_name"),
         ).annotate(
             primary_competitor=Case(
                 When(
                     primary__isnull=True,
-                    then=query.filter(zone__iexact="all").values(
-                        "primary_competitor_name"
-                    ),
+                    then=query.filter(zone="all").values("primary_competitor_name"),
                 ),
                 default=F("primary"),
             ),
             secondary_competitor=Case(
                 When(
                     secondary__isnull=True,
-                    then=query.filter(zone__iexact="all").values(
-                        "secondary_competitor_name"
-                    ),
+                    then=query.filter(zone="all").values("secondary_competitor_name"),
                 ),
                 default=F("secondary"),
             ),
@@ -504,42 +499,38 @@ class ScenarioScopeZoneDetailsManager(Manager):
         query1 = cm.PriceIndexTarget.objects.filter(
             scenario=OuterRef("pricingscenarioscope__scenario"),
             opstudy=OuterRef("pricingscenarioscope__article__opstudy_id"),
-            zone=Cast(OuterRef("zone"), CharField()),
-            kvi_class__iexact=OuterRef("kvi_class"),
-            promo_status__iexact=OuterRef("promo_status"),
+            zone_ref=OuterRef("zone"),
+            kvi_class=Lower(OuterRef("kvi_class")),
+            promo_status=Lower(OuterRef("promo_status")),
         )
 
         query2 = cm.KVIIndexTarget.objects.filter(
-            opstudy=Cast(
-                OuterRef("pricingscenarioscope__article__opstudy_id"), CharField()
-            ),
-            zone=Cast(OuterRef("zone"), CharField()),
-            kvi_class__iexact=OuterRef("kvi_class"),
-            promo_status__iexact=OuterRef("promo_status"),
+            opstudy_ref=OuterRef("pricingscenarioscope__article__opstudy_id"),
+            zone_ref=OuterRef("zone"),
+            kvi_class=Lower(OuterRef("kvi_class")),
+            promo_status=Lower(OuterRef("promo_status")),
         )
 
         query3 = cm.PriceIndexTarget.objects.filter(
             scenario=OuterRef("pricingscenarioscope__scenario"),
             opstudy=OuterRef("pricingscenarioscope__article__opstudy_id"),
-            zone__iexact="all",
-            kvi_class__iexact=OuterRef("kvi_class"),
-            promo_status__iexact=OuterRef("promo_status"),
+            zone="all",
+            kvi_class=Lower(OuterRef("kvi_class")),
+            promo_status=Lower(OuterRef("promo_status")),
         )
 
         query4 = cm.KVIIndexTarget.objects.filter(
-            opstudy=Cast(
-                OuterRef("pricingscenarioscope__article__opstudy_id"), CharField()
-            ),
-            zone__iexact="all",
-            kvi_class__iexact=OuterRef("kvi_class"),
-            promo_status__iexact=OuterRef("promo_status"),
+            opstudy_ref=OuterRef("pricingscenarioscope__article__opstudy_id"),
+            zone="all",
+            kvi_class=Lower(OuterRef("kvi_class")),
+            promo_status=Lower(OuterRef("promo_status")),
         )
 
         query5 = cm.KVIIndexTarget.objects.filter(
-            opstudy__iexact="all",
-            zone__iexact="all",
-            kvi_class__iexact=OuterRef("kvi_class"),
-            promo_status__iexact=OuterRef("promo_status"),
+            opstudy="all",
+            zone="all",
+            kvi_class=Lower(OuterRef("kvi_class")),
+            promo_status=Lower(OuterRef("promo_status")),
         )
 
         return (
@@ -556,20 +547,20 @@ class ScenarioScopeZoneDetailsManager(Manager):
             )
             .alias(
                 primary_p1_from=query1.filter(
-                    primary_secondary__iexact="primary",
-                    competitor_type__iexact=OuterRef("primary_competitor"),
+                    primary_secondary="primary",
+                    competitor_type=Lower(OuterRef("primary_competitor")),
                 ).values("index_min"),
                 primary_p1_to=query1.filter(
-                    primary_secondary__iexact="primary",
-                    competitor_type__iexact=OuterRef("primary_competitor"),
+                    primary_secondary="primary",
+                    competitor_type=Lower(OuterRef("primary_competitor")),
                 ).values("index_max"),
                 secondary_p1_from=query1.filter(
-                    primary_secondary__iexact="secondary",
-                    competitor_type__iexact=OuterRef("secondary_competitor"),
+                    primary_secondary="secondary",
+                    competitor_type=Lower(OuterRef("secondary_competitor")),
                 ).values("index_min"),
                 secondary_p1_to=query1.filter(
-                    primary_secondary__iexact="secondary",
-                    competitor_type__iexact=OuterRef("secondary_competitor"),
+                    primary_secondary="secondary",
+                    competitor_type=Lower(OuterRef("secondary_competitor")),
                 ).values("index_max"),
             )
             .alias(
@@ -577,8 +568,8 @@ class ScenarioScopeZoneDetailsManager(Manager):
                     When(
                         primary_p1_from__isnull=True,
                         then=query2.filter(
-                            primary_secondary__iexact="primary",
-                            competitor_type__iexact=OuterRef("primary_competitor"),
+                            primary_secondary="primary",
+                            competitor_type=Lower(OuterRef("primary_competitor")),
                         ).values("index_min"),
                     ),
                     default=F("primary_p1_from"),
@@ -587,8 +578,8 @@ class ScenarioScopeZoneDetailsManager(Manager):
                     When(
                         primary_p1_to__isnull=True,
                         then=query2.filter(
-                            primary_secondary__iexact="primary",
-                            competitor_type__iexact=OuterRef("primary_competitor"),
+                            primary_secondary="primary",
+                            competitor_type=Lower(OuterRef("primary_competitor")),
                         ).values("index_max"),
                     ),
                     default=F("primary_p1_to"),
@@ -597,8 +588,8 @@ class ScenarioScopeZoneDetailsManager(Manager):
                     When(
                         secondary_p1_from__isnull=True,
                         then=query2.filter(
-                            primary_secondary__iexact="secondary",
-                            competitor_type__iexact=OuterRef("secondary_competitor"),
+                            primary_secondary="secondary",
+                            competitor_type=Lower(OuterRef("secondary_competitor")),
                         ).values("index_min"),
                     ),
                     default=F("secondary_p1_from"),
@@ -607,8 +598,8 @@ class ScenarioScopeZoneDetailsManager(Manager):
                     When(
                         secondary_p1_to__isnull=True,
                         then=query2.filter(
-                            primary_secondary__iexact="secondary",
-                            competitor_type__iexact=OuterRef("secondary_competitor"),
+                            primary_secondary="secondary",
+                            competitor_type=Lower(OuterRef("secondary_competitor")),
                         ).values("index_max"),
                     ),
                     default=F("secondary_p1_to"),
@@ -619,8 +610,8 @@ class ScenarioScopeZoneDetailsManager(Manager):
                     When(
                         primary_p2_from__isnull=True,
                         then=query3.filter(
-                            primary_secondary__iexact="primary",
-                            competitor_type__iexact=OuterRef("primary_competitor"),
+                            primary_secondary="primary",
+                            competitor_type=Lower(OuterRef("primary_competitor")),
                         ).values("index_min"),
                     ),
                     default=F("primary_p2_from"),
@@ -629,8 +620,8 @@ class ScenarioScopeZoneDetailsManager(Manager):
                     When(
                         primary_p2_to__isnull=True,
                         then=query3.filter(
-                            primary_secondary__iexact="primary",
-                            competitor_type__iexact=OuterRef("primary_competitor"),
+                            primary_secondary="primary",
+                            competitor_type=Lower(OuterRef("primary_competitor")),
                         ).values("index_max"),
                     ),
                     default=F("primary_p2_to"),
@@ -639,8 +630,8 @@ class ScenarioScopeZoneDetailsManager(Manager):
                     When(
                         secondary_p2_from__isnull=True,
                         then=query3.filter(
-                            primary_secondary__iexact="secondary",
-                            competitor_type__iexact=OuterRef("secondary_competitor"),
+                            primary_secondary="secondary",
+                            competitor_type=Lower(OuterRef("secondary_competitor")),
                         ).values("index_min"),
                     ),
                     default=F("secondary_p2_from"),
@@ -649,8 +640,8 @@ class ScenarioScopeZoneDetailsManager(Manager):
                     When(
                         secondary_p2_to__isnull=True,
                         then=query3.filter(
-                            primary_secondary__iexact="secondary",
-                            competitor_type__iexact=OuterRef("secondary_competitor"),
+                            primary_secondary="secondary",
+                            competitor_type=Lower(OuterRef("secondary_competitor")),
                         ).values("index_max"),
                     ),
                     default=F("secondary_p2_to"),
@@ -661,8 +652,8 @@ class ScenarioScopeZoneDetailsManager(Manager):
                     When(
                         primary_p3_from__isnull=True,
                         then=query4.filter(
-                            primary_secondary__iexact="primary",
-                            competitor_type__iexact=OuterRef("primary_competitor"),
+                            primary_secondary="primary",
+                            competitor_type=Lower(OuterRef("primary_competitor")),
                         ).values("index_min"),
                     ),
                     default=F("primary_p3_from"),
@@ -671,8 +662,8 @@ class ScenarioScopeZoneDetailsManager(Manager):
                     When(
                         primary_p3_to__isnull=True,
                         then=query4.filter(
-                            primary_secondary__iexact="primary",
-                            competitor_type__iexact=OuterRef("primary_competitor"),
+                            primary_secondary="primary",
+                            competitor_type=Lower(OuterRef("primary_competitor")),
                         ).values("index_max"),
                     ),
                     default=F("primary_p3_to"),
@@ -681,8 +672,8 @@ class ScenarioScopeZoneDetailsManager(Manager):
                     When(
                         secondary_p3_from__isnull=True,
                         then=query4.filter(
-                            primary_secondary__iexact="secondary",
-                            competitor_type__iexact=OuterRef("secondary_competitor"),
+                            primary_secondary="secondary",
+                            competitor_type=Lower(OuterRef("secondary_competitor")),
                         ).values("index_min"),
                     ),
                     default=F("secondary_p3_from"),
@@ -691,8 +682,8 @@ class ScenarioScopeZoneDetailsManager(Manager):
                     When(
                         secondary_p3_to__isnull=True,
                         then=query4.filter(
-                            primary_secondary__iexact="secondary",
-                            competitor_type__iexact=OuterRef("secondary_competitor"),
+                            primary_secondary="secondary",
+                            competitor_type=Lower(OuterRef("secondary_competitor")),
                         ).values("index_max"),
                     ),
                     default=F("secondary_p3_to"),
@@ -703,8 +694,8 @@ class ScenarioScopeZoneDetailsManager(Manager):
                     When(
                         primary_p4_from__isnull=True,
                         then=query5.filter(
-                            primary_secondary__iexact="primary",
-                            competitor_type__iexact=OuterRef("primary_competitor"),
+                            primary_secondary="primary",
+                            competitor_type=Lower(OuterRef("primary_competitor")),
                         ).values("index_min"),
                     ),
                     default=F("primary_p4_from"),
@@ -713,8 +704,8 @@ class ScenarioScopeZoneDetailsManager(Manager):
                     When(
                         primary_p4_to__isnull=True,
                         then=query5.filter(
-                            primary_secondary__iexact="primary",
-                            competitor_type__iexact=OuterRef("primary_competitor"),
+                            primary_secondary="primary",
+                            competitor_type=Lower(OuterRef("primary_competitor")),
                         ).values("index_max"),
                     ),
                     default=F("primary_p4_to"),
@@ -723,8 +714,8 @@ class ScenarioScopeZoneDetailsManager(Manager):
                     When(
                         secondary_p4_from__isnull=True,
                         then=query5.filter(
-                            primary_secondary__iexact="secondary",
-                            competitor_type__iexact=OuterRef("secondary_competitor"),
+                            primary_secondary="secondary",
+                            competitor_type=Lower(OuterRef("secondary_competitor")),
                         ).values("index_min"),
                     ),
                     default=F("secondary_p4_from"),
@@ -733,8 +724,8 @@ class ScenarioScopeZoneDetailsManager(Manager):
                     When(
                         secondary_p4_to__isnull=True,
                         then=query5.filter(
-                            primary_secondary__iexact="secondary",
-                            competitor_type__iexact=OuterRef("secondary_competitor"),
+                            primary_secondary="secondary",
+                            competitor_type=Lower(OuterRef("secondary_competitor")),
                         ).values("index_max"),
                     ),
                     default=F("secondary_p4_to"),
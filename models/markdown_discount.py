@@ -0,0 +1,151 @@
+from bisect import bisect_left
+from decimal import ROUND_HALF_UP, Decimal
+
+from core import models as cm
+
+CENT = Decimal("0.01")
+WILDCARD = "all"
+
+
+class PriceRoundingRuleIndex:
+    """
+    In-memory index of `PriceRoundingRule` rows keyed by (opstudy, brand,
+    zone), any of which may be the "all" wildcard. Load it once per batch and
+    reuse it for every price in the batch.
+    """
+
+    def __init__(self, rules):
+        self.rules = {}
+        for rule in rules:
+            key = tuple(
+                str(value).strip().lower()
+                for value in (rule.opstudy, rule.brand, rule.zone)
+            )
+            self.rules.setdefault(key, []).append(
+                (rule.price_from, rule.price_to, rule.dollars, rule.decimals)
+            )
+        self._cache = {}
+
+    @classmethod
+    def load(cls):
+        return cls(cm.PriceRoundingRule.objects.all())
+
+    def candidates(self, opstudy, brand, zone):
+        """
+        Rules for the most specific matching key, falling back to wildcards on
+        zone, then brand, then opstudy: a rule for (all, all, zone) still wins
+        over (all, all, all).
+        """
+        key = tuple(str(v).strip().lower() for v in (opstudy, brand, zone))
+        if key not in self._cache:
+            o, b, z = key
+            for lookup in (
+                (o, b, z),
+                (o, b, WILDCARD),
+                (o, WILDCARD, z),
+                (o, WILDCARD, WILDCARD),
+                (WILDCARD, b, z),
+                (WILDCARD, b, WILDCARD),
+                (WILDCARD, WILDCARD, z),
+                (WILDCARD, WILDCARD, WILDCARD),
+            ):
+                if lookup in self.rules:
+                    self._cache[key] = self.rules[lookup]
+                    break
+            else:
+                self._cache[key] = []
+        return self._cache[key]
+
+    def round(self, price, opstudy=WILDCARD, brand=WILDCARD, zone=WILDCARD):
+        """
+        Round `price` down to the closest allowed ending of the rule covering
+        it. `decimals` lists the allowed cents and `dollars` the allowed last
+        digits of the dollar amount; an empty list allows anything. Prices not
+        covered by a rule, or with no allowed ending at or below them, are
+        returned unchanged.
+        """
+        for price_from, price_to, dollars, decimals in self.candidates(
+            opstudy, brand, zone
+        ):
+            if not price_from <= price <= price_to:
+                continue
+            cents = sorted(decimals or range(100), reverse=True)
+            whole = int(price)
+            for dollar in range(whole, max(whole - 10, -1), -1):
+                if dollars and dollar % 10 not in dollars:
+                    continue
+                for cent in cents:
+                    candidate = Decimal(dollar) + Decimal(cent) * CENT
+                    if candidate <= price:
+                        return candidate
+            return price
+        return price
+
+
+class DiscountNotchSnapper:
+    """
+    Snap batches of candidate discounts to a scenario's discount notches and,
+    under `ENFORCEROUNDEDENDINGS`, round the discounted prices to the endings
+    allowed by `PriceRoundingRule`.
+    """
+
+    def __init__(self, notches, enforce_rounded_endings=True, rounding=None):
+        self.notches = sorted(notches or [])
+        self.enforce_rounded_endings = enforce_rounded_endings
+        self.rounding = rounding
+        if enforce_rounded_endings and rounding is None:
+            self.rounding = PriceRoundingRuleIndex.load()
+
+    @classmethod
+    def for_scenario(cls, scenario, after_season=False, rounding=None):
+        return cls(
+            scenario.after_season_discount_notches
+            if after_season
+            else scenario.discount_notches,
+            enforce_rounded_endings=scenario.discount_logic
+            == cm.MarkdownScenarioDiscountLogic.ENFORCEROUNDEDENDINGS,
+            rounding=rounding,
+        )
+
+    def snap_discount(self, discount):
+        """
+        Nearest allowed notch; ties go to the smaller discount. Without
+        notches the discount is returned unchanged.
+        """
+        if not self.notches or discount is None:
+            return discount
+        i = bisect_left(self.notches, discount)
+        if i == 0:
+            return self.notches[0]
+        if i == len(self.notches):
+            return self.notches[-1]
+        lower, upper = self.notches[i - 1], self.notches[i]
+        return lower if discount - lower <= upper - discount else upper
+
+    def snap(self, base_prices, discounts, rule_keys=None):
+        """
+        Return (discount_percentage, discounted_price) lists for parallel
+        lists of base prices and candidate discounts. `rule_keys` optionally
+        gives an (opstudy, brand, zone) tuple per row for rounding-rule
+        selection. When a price is rounded, the discount is recomputed from
+        the rounded price.
+        """
+        discount_percentages, discounted_prices = [], []
+        for i, (base, discount) in enumerate(zip(base_prices, discounts)):
+            discount = self.snap_discount(discount)
+            if base is None or discount is None:
+                discount_percentages.append(discount)
+                discounted_prices.append(None)
+                continue
+            base = Decimal(str(base))
+            price = (base * (1 - Decimal(str(discount)))).quantize(
+                CENT, rounding=ROUND_HALF_UP
+            )
+            if self.enforce_rounded_endings:
+                key = rule_keys[i] if rule_keys is not None else ()
+                price = self.rounding.round(price, *key)
+                if base:
+                    discount = round(float(1 - price / base), 4)
+            discount_percentages.append(discount)
+            discounted_prices.append(price)
+        return discount_percentages, discounted_prices
@@ -0,0 +1,205 @@
+from django.db import connection, models
+from django.db.models.signals import post_delete, post_save
+
+from core import models as cm
+from core.models import mixins as core_mixins
+from core.models.bulk import defer_on_commit, qn
+
+
+class MarkdownPriceSource(models.TextChoices):
+    PLANNED = "PLANNED"
+    CLUSTERPLANNED = "CLUSTERPLANNED"
+    RECOMMENDED = "RECOMMENDED"
+
+
+def effective_price_sql(recommended=None):
+    """
+    SELECT returning the winning discount and price per
+    (scope, store_cluster, update_period, read_and_react) for the scenarios
+    given by `effective_price_params`.
+
+    Precedence is scope-level planned, then cluster-level planned, then
+    recommended. The grid is every key that has a recommended or a
+    scope-level planned price, plus every scope of the scenario for each
+    cluster-level override. A cluster override's discount is applied to each
+    scope's own base price; its `discounted_price`, computed from a reference
+    base price, is only used for scopes without one.
+
+    `recommended` names a table to read the recommended prices from instead.
+    """
+    rec = qn(recommended or cm.MarkdownScenarioRecommendedPrice._meta.db_table)
+    planned = qn(cm.MarkdownScenarioPlannedPrice._meta.db_table)
+    cluster = qn(cm.MarkdownScenarioClusterPlannedPrice._meta.db_table)
+    scope = qn(cm.MarkdownScenarioScope._meta.db_table)
+    key = "scenario_id, markdownscenarioscope_id, store_cluster, update_period, "
+    key += "read_and_react"
+    return (
+        f"SELECT k.scenario_id, k.markdownscenarioscope_id, k.store_cluster, "
+        "k.update_period, k.read_and_react, "
+        "coalesce(p.after_season, r.after_season, c.after_season, false) "
+        "AS after_season, "
+        "coalesce(p.base_price, r.base_price) AS base_price, "
+        "CASE WHEN p.id IS NOT NULL THEN p.discount_percentage "
+        "WHEN c.id IS NOT NULL THEN c.discount_percentage "
+        "ELSE r.discount_percentage END AS discount_percentage, "
+        "CASE WHEN p.id IS NOT NULL THEN p.discounted_price "
+        "WHEN c.id IS NOT NULL THEN coalesce(round(coalesce(p.base_price, "
+        "r.base_price) * (1 - c.discount_percentage)::numeric, 2), "
+        "c.discounted_price) "
+        "ELSE r.discounted_price END AS discounted_price, "
+        f"CASE WHEN p.id IS NOT NULL THEN '{MarkdownPriceSource.PLANNED}' "
+        f"WHEN c.id IS NOT NULL THEN '{MarkdownPriceSource.CLUSTERPLANNED}' "
+        f"ELSE '{MarkdownPriceSource.RECOMMENDED}' END AS source "
+        f"FROM (SELECT {key} FROM {rec} WHERE scenario_id = ANY(%s) "
+        f"UNION SELECT {key} FROM {planned} WHERE scenario_id = ANY(%s) "
+        "UNION SELECT s.scenario_id, s.id, c.store_cluster, c.update_period, "
+        f"c.read_and_react FROM {scope} s JOIN {cluster} c "
+        "ON c.scenario_id = s.scenario_id WHERE s.scenario_id = ANY(%s)) k "
+        f"LEFT JOIN {rec} r ON r.scenario_id = k.scenario_id "
+        "AND r.markdownscenarioscope_id = k.markdownscenarioscope_id "
+        "AND r.store_cluster = k.store_cluster "
+        "AND r.update_period = k.update_period "
+        "AND r.read_and_react = k.read_and_react "
+        f"LEFT JOIN {planned} p ON p.scenario_id = k.scenario_id "
+        "AND p.markdownscenarioscope_id = k.markdownscenarioscope_id "
+        "AND p.store_cluster = k.store_cluster "
+        "AND p.update_period = k.update_period "
+        "AND p.read_and_react = k.read_and_react "
+        f"LEFT JOIN {cluster} c ON c.scenario_id = k.scenario_id "
+        "AND c.store_cluster = k.store_cluster "
+        "AND c.update_period = k.update_period "
+        "AND c.read_and_react = k.read_and_react "
+        "AND (coalesce(p.after_season, r.after_season) IS NULL "
+        "OR c.after_season IS NOT DISTINCT FROM "
+        "coalesce(p.after_season, r.after_season))"
+    )
+
+
+def effective_price_params(scenario_ids):
+    scenario_ids = list(scenario_ids)
+    return [scenario_ids, scenario_ids, scenario_ids]
+
+
+class EffectivePriceRefresh:
+    """
+    On-commit callback refreshing the materialized effective prices of the
+    hot scenarios among those collected during the transaction.
+    """
+
+    def __init__(self):
+        self.scenario_ids = set()
+
+    def add(self, scenario_ids):
+        self.scenario_ids.update(i for i in scenario_ids if i is not None)
+
+    def __call__(self):
+        effective = MarkdownScenarioEffectivePrice.objects
+        hot = (
+            effective.filter(scenario_id__in=self.scenario_ids)
+            .values_list("scenario_id", flat=True)
+            .distinct()
+        )
+        hot = sorted(set(hot))
+        if hot:
+            effective.refresh(hot)
+
+
+class MarkdownScenarioEffectivePriceManager(models.Manager):
+    def resolve(self, scenario_ids):
+        """
+        Resolve effective prices without materializing them. Returns a list of
+        dicts keyed like the columns of `MarkdownScenarioEffectivePrice`.
+        """
+        scenario_ids = list(scenario_ids)
+        with connection.cursor() as cursor:
+            cursor.execute(effective_price_sql(), effective_price_params(scenario_ids))
+            columns = [col[0] for col in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def refresh(self, scenario_ids, recommended=None):
+        """
+        Rebuild the materialized effective prices of the given (hot)
+        scenarios. Runs when results are loaded, reading the recommended
+        prices from the `recommended` table about to be swapped in, and,
+        through `EffectivePriceRefresh`, when planned or cluster planned
+        prices are written.
+        """
+        scenario_ids = list(scenario_ids)
+        table = qn(self.model._meta.db_table)
+        columns = (
+            "scenario_id, markdownscenarioscope_id, store_cluster, update_period, "
+            "read_and_react, after_season, base_price, discount_percentage, "
+            "discounted_price, source"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {table} WHERE scenario_id = ANY(%s)", [scenario_ids]
+            )
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}, created_at, updated_at) "
+                f"SELECT {columns}, now(), now() "
+                f"FROM ({effective_price_sql(recommended)}) e",
+                effective_price_params(scenario_ids),
+            )
+            return cursor.rowcount
+
+
+class MarkdownScenarioEffectivePrice(core_mixins.TimeStampMixin, models.Model):
+    """Hold resolved markdown prices for hot scenarios"""
+
+    objects = MarkdownScenarioEffectivePriceManager()
+
+    scenario = models.ForeignKey(
+        "core.MarkdownScenario",
+        on_delete=models.CASCADE,
+        related_name="effective_prices",
+    )
+    markdownscenarioscope = models.ForeignKey(
+        "core.MarkdownScenarioScope",
+        on_delete=models.CASCADE,
+        related_name="effective",
+    )
+    store_cluster = models.IntegerField()
+    update_period = models.IntegerField()
+    read_and_react = models.BooleanField(default=False)
+    after_season = models.BooleanField(default=False)
+    base_price = models.DecimalField(
+        decimal_places=2,
+        max_digits=10,
+        null=True,
+        blank=True,
+    )
+    discount_percentage = models.FloatField(null=True, blank=True)
+    discounted_price = models.DecimalField(
+        decimal_places=2,
+        max_digits=10,
+        null=True,
+        blank=True,
+    )
+    source = models.CharField(
+        max_length=20,
+        choices=MarkdownPriceSource.choices,
+        default=MarkdownPriceSource.RECOMMENDED,
+    )
+
+    class Meta:
+        unique_together = (
+            "scenario",
+            "markdownscenarioscope",
+            "store_cluster",
+            "update_period",
+            "read_and_react",
+        )
+        ordering = ["id"]
+
+
+def _refresh_effective_prices(sender, instance, **kwargs):
+    defer_on_commit(EffectivePriceRefresh, [instance.scenario_id])
+
+
+for _sender in (
+    "core.MarkdownScenarioPlannedPrice",
+    "core.MarkdownScenarioClusterPlannedPrice",
+):
+    post_save.connect(_refresh_effective_prices, sender=_sender, weak=False)
+    post_delete.connect(_refresh_effective_prices, sender=_sender, weak=False)
@@ -0,0 +1,175 @@
+from django.db import connection, models, transaction
+from django.db.models.signals import post_delete, post_save
+
+from core import models as cm
+from core.models import mixins as core_mixins
+from core.models.bulk import defer_on_commit, qn
+
+KPI_GROUP = (
+    "scenario_id",
+    "update_period",
+    "store_cluster",
+    "after_season",
+    "read_and_react",
+)
+
+
+class KPIRefresh:
+    """
+    On-commit callback refreshing the KPI groups of the (scenario,
+    update_period, store_cluster) keys collected during the transaction.
+    """
+
+    def __init__(self):
+        self.keys = set()
+
+    def add(self, keys):
+        self.keys.update(key for key in keys if None not in key)
+
+    def __call__(self):
+        groups = {}
+        for scenario_id, update_period, store_cluster in self.keys:
+            groups.setdefault(scenario_id, []).append((update_period, store_cluster))
+        for scenario_id, keys in sorted(groups.items()):
+            with transaction.atomic():
+                MarkdownScenarioKPI.objects.refresh(scenario_id, keys=sorted(keys))
+
+
+class MarkdownScenarioKPIManager(models.Manager):
+    @staticmethod
+    def _filters(alias, scenario, read_and_react, keys):
+        where = [f"{alias}.scenario_id = %s"]
+        params = [getattr(scenario, "id", scenario)]
+        if read_and_react is not None:
+            where.append(f"{alias}.read_and_react = %s")
+            params.append(read_and_react)
+        if keys is not None:
+            periods, clusters = zip(*keys) if keys else ((), ())
+            where.append(
+                f"({alias}.update_period, {alias}.store_cluster) IN "
+                "(SELECT * FROM unnest(%s::integer[], %s::integer[]))"
+            )
+            params.extend([list(periods), list(clusters)])
+        return " AND ".join(where), params
+
+    def refresh(self, scenario, read_and_react=None, keys=None, recommended=None):
+        """
+        Recompute the KPI rows of a scenario from its recommended prices and
+        planned overrides in one INSERT ... SELECT, then drop rows whose group
+        no longer has any price. Overrides win as in `effective_price_sql`:
+        scope-level planned, then cluster-level planned.
+
+        Only the groups touched by a load need recomputing: restrict to one
+        `read_and_react` variant and/or to a list of
+        (update_period, store_cluster) `keys`. `recommended` names a table
+        to read the recommended prices from instead, e.g. a partition about
+        to be swapped in.
+        """
+        kpi_table = qn(self.model._meta.db_table)
+        rec_table = qn(
+            recommended or cm.MarkdownScenarioRecommendedPrice._meta.db_table
+        )
+        planned_table = qn(cm.MarkdownScenarioPlannedPrice._meta.db_table)
+        cluster_table = qn(cm.MarkdownScenarioClusterPlannedPrice._meta.db_table)
+
+        where, params = self._filters("r", scenario, read_and_react, keys)
+        stale, _ = self._filters("k", scenario, read_and_react, keys)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {kpi_table} ({', '.join(KPI_GROUP)}, revenue, demand, "
+                "margin, second_margin, per_start_stock, avg_discount, "
+                "price_count, created_at, updated_at) "
+                "SELECT r.scenario_id, r.update_period, r.store_cluster, "
+                "coalesce(r.after_season, false), r.read_and_react, "
+                "sum(r.revenue), sum(r.demand), sum(r.margin), sum(r.second_margin), "
+                "avg(r.per_start_stock), "
+                "avg(CASE WHEN p.id IS NOT NULL THEN p.discount_percentage "
+                "WHEN c.id IS NOT NULL THEN c.discount_percentage "
+                "ELSE r.discount_percentage END), "
+                "count(*), now(), now() "
+                f"FROM {rec_table} r LEFT JOIN {planned_table} p "
+                "ON p.scenario_id = r.scenario_id "
+                "AND p.markdownscenarioscope_id = r.markdownscenarioscope_id "
+                "AND p.store_cluster = r.store_cluster "
+                "AND p.update_period = r.update_period "
+                "AND p.read_and_react = r.read_and_react "
+                f"LEFT JOIN {cluster_table} c ON c.scenario_id = r.scenario_id "
+                "AND c.store_cluster = r.store_cluster "
+                "AND c.update_period = r.update_period "
+                "AND c.read_and_react = r.read_and_react "
+                "AND (coalesce(p.after_season, r.after_season) IS NULL "
+                "OR c.after_season IS NOT DISTINCT FROM "
+                "coalesce(p.after_season, r.after_season)) "
+                f"WHERE {where} GROUP BY 1, 2, 3, 4, 5 "
+                f"ON CONFLICT ({', '.join(KPI_GROUP)}) DO UPDATE SET "
+                "revenue = excluded.revenue, demand = excluded.demand, "
+                "margin = excluded.margin, second_margin = excluded.second_margin, "
+                "per_start_stock = excluded.per_start_stock, "
+                "avg_discount = excluded.avg_discount, "
+                "price_count = excluded.price_count, updated_at = now()",
+                params,
+            )
+            cursor.execute(
+                f"DELETE FROM {kpi_table} k WHERE {stale} "
+                f"AND NOT EXISTS (SELECT 1 FROM {rec_table} r "
+                "WHERE r.scenario_id = k.scenario_id "
+                "AND r.update_period = k.update_period "
+                "AND r.store_cluster = k.store_cluster "
+                "AND coalesce(r.after_season, false) = k.after_season "
+                "AND r.read_and_react = k.read_and_react)",
+                params,
+            )
+
+
+class MarkdownScenarioKPI(core_mixins.TimeStampMixin, models.Model):
+    """
+    Hold recommended price totals per scenario, update period and store cluster.
+    Maintained by `MarkdownScenarioKPI.objects.refresh`.
+    """
+
+    objects = MarkdownScenarioKPIManager()
+
+    scenario = models.ForeignKey(
+        "core.MarkdownScenario",
+        on_delete=models.CASCADE,
+        related_name="kpis",
+    )
+    update_period = models.IntegerField()
+    store_cluster = models.IntegerField()
+    after_season = models.BooleanField(default=False)
+    read_and_react = models.BooleanField(default=False)
+
+    revenue = models.FloatField(null=True, blank=True)
+    demand = models.FloatField(null=True, blank=True)
+    margin = models.FloatField(null=True, blank=True)
+    second_margin = models.FloatField(null=True, blank=True)
+    per_start_stock = models.FloatField(null=True, blank=True)
+    # Average of the planned discount where overridden, else recommended.
+    avg_discount = models.FloatField(null=True, blank=True)
+    price_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = (
+            "scenario",
+            "update_period",
+            "store_cluster",
+            "after_season",
+            "read_and_react",
+        )
+        ordering = ["id"]
+
+
+def _refresh_kpis(sender, instance, **kwargs):
+    defer_on_commit(
+        KPIRefresh,
+        [(instance.scenario_id, instance.update_period, instance.store_cluster)],
+    )
+
+
+for _sender in (
+    "core.MarkdownScenarioPlannedPrice",
+    "core.MarkdownScenarioClusterPlannedPrice",
+):
+    post_save.connect(_refresh_kpis, sender=_sender, weak=False)
+    post_delete.connect(_refresh_kpis, sender=_sender, weak=False)
@@ -1,9 +1,74 @@
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from core import models as cm
 from core.models import mixins as core_mixins
+from core.models.bulk import defer_on_commit
+from core.models.markdown_effective_price import EffectivePriceRefresh
+from core.models.markdown_kpi import KPIRefresh
+
+
+class MarkdownScenarioPriceQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        Fill the denormalized `scenario` from the scope, like `save()` does,
+        with one query for the whole batch, and refresh the effective prices
+        of the touched scenarios on commit, plus the KPIs of the touched
+        groups for planned prices.
+        """
+        objs = list(objs)
+        scope_ids = {
+            obj.markdownscenarioscope_id
+            for obj in objs
+            if obj.scenario_id is None and obj.markdownscenarioscope_id is not None
+        }
+        if scope_ids:
+            scenarios = dict(
+                cm.MarkdownScenarioScope.objects.filter(id__in=scope_ids).values_list(
+                    "id", "scenario_id"
+                )
+            )
+            for obj in objs:
+                if obj.scenario_id is None:
+                    obj.scenario_id = scenarios.get(obj.markdownscenarioscope_id)
+        created = super().bulk_create(objs, *args, **kwargs)
+        defer_on_commit(EffectivePriceRefresh, {obj.scenario_id for obj in objs})
+        if self.model is cm.MarkdownScenarioPlannedPrice:
+            defer_on_commit(
+                KPIRefresh,
+                {(o.scenario_id, o.update_period, o.store_cluster) for o in objs},
+            )
+        return created
+
+    def update(self, **kwargs):
+        """
+        Keep the denormalized `scenario` in step when rows are moved to
+        another scope.
+        """
+        scope = kwargs.get("markdownscenarioscope")
+        scope = kwargs.get("markdownscenarioscope_id", scope)
+        if scope is not None and not {"scenario", "scenario_id"} & set(kwargs):
+            kwargs["scenario_id"] = cm.MarkdownScenarioScope.objects.values_list(
+                "scenario_id", flat=True
+            ).get(pk=getattr(scope, "pk", scope))
+        return super().update(**kwargs)
+
+    def for_scenario(self, scenario):
+        """
+        Filter on the denormalized scenario column rather than through scope,
+        so that the planner can prune every other scenario's partition.
+        """
+        return self.filter(scenario=scenario)
 
 
 class MarkdownScenarioPrice(core_mixins.TimeStampMixin, models.Model):
+    objects = MarkdownScenarioPriceQuerySet.as_manager()
+
+    # Denormalized from `markdownscenarioscope`; partition key of the table.
+    scenario = models.ForeignKey(
+        "core.MarkdownScenario",
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
     markdownscenarioscope = models.ForeignKey(
         "core.MarkdownScenarioScope",
         on_delete=models.CASCADE,
@@ -52,9 +117,15 @@ class MarkdownScenarioPrice(core_mixins.TimeStampMixin, models.Model):
         except Exception:
             pass
 
+    def save(self, *args, **kwargs):
+        if self.scenario_id is None and self.markdownscenarioscope_id is not None:
+            self.scenario_id = self.markdownscenarioscope.scenario_id
+        super().save(*args, **kwargs)
+
     class Meta:
         abstract = True
         unique_together = (
+            "scenario",
             "store_cluster",
             "markdownscenarioscope",
             "update_period",
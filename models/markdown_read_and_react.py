@@ -0,0 +1,157 @@
+from django.db import connection, models
+
+from core import models as cm
+from core.models import mixins as core_mixins
+from core.models.bulk import qn
+
+
+class MarkdownScenarioReadAndReactManager(models.Manager):
+    def live_scenarios(self):
+        return (
+            cm.MarkdownScenario.objects.filter(
+                status=cm.MarkdownScenarioStatus.DONE,
+                approval_status=cm.MarkdownScenarioApprovalStatus.APPROVED,
+            )
+            .exclude(event__status=cm.MarkdownEventStatus.ARCHIVED)
+            .values_list("id", flat=True)
+        )
+
+    def refresh(self, scenario_ids=None):
+        """
+        Rebuild the forecast-vs-actual summary of many scenarios in one pass,
+        defaulting to every live (done and approved) scenario.
+
+        Daily actuals are bucketed into the update period whose `period_date`
+        is the latest one on or before the sale date. The last in-season
+        period ends at the first after-season period, or else with the event,
+        so later sales are not counted in season. Forecasts come from the
+        original (non read-and-react, in-season) recommendations as rolled up
+        in `MarkdownScenarioKPI`, so the price table itself is not scanned.
+        Running totals per scenario give the cumulative sell-through curves;
+        the actual one is NULL for periods starting after the last actuals.
+        """
+        if scenario_ids is None:
+            scenario_ids = self.live_scenarios()
+        scenario_ids = list(scenario_ids)
+        if not scenario_ids:
+            return 0
+
+        summary_table = qn(self.model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "WITH periods AS ("
+                "SELECT s.id AS scenario_id, p.ord::integer AS update_period, "
+                "(p.value ->> 'period_date')::date AS period_date, "
+                "least(lead((p.value ->> 'period_date')::date) OVER ("
+                "PARTITION BY s.id ORDER BY (p.value ->> 'period_date')::date), "
+                "(SELECT min((x ->> 'period_date')::date) FROM jsonb_array_elements("
+                "coalesce(s.after_season_update_periods, '[]'::jsonb)) x), "
+                "e.end_date + 1) AS next_date "
+                f"FROM {qn(cm.MarkdownScenario._meta.db_table)} s "
+                f"JOIN {qn(cm.MarkdownEvent._meta.db_table)} e ON e.id = s.event_id, "
+                "jsonb_array_elements(coalesce(s.update_periods, '[]'::jsonb)) "
+                "WITH ORDINALITY AS p(value, ord) WHERE s.id = ANY(%s)), "
+                "loaded AS ("
+                "SELECT scenario_id, max(date) AS last_date "
+                f"FROM {qn(cm.MarkdownScenarioActualSales._meta.db_table)} "
+                "WHERE scenario_id = ANY(%s) GROUP BY 1), "
+                "actuals AS ("
+                "SELECT pr.scenario_id, pr.update_period, "
+                "sum(a.units_sold) AS units, sum(a.revenue) AS revenue, "
+                "sum(a.markdown_spend) AS markdown_spend, "
+                "sum(a.gross_profit) AS gross_profit, "
+                "(array_agg(a.sell_through ORDER BY a.date DESC))[1] AS sell_through "
+                f"FROM periods pr JOIN "
+                f"{qn(cm.MarkdownScenarioActualSales._meta.db_table)} a "
+                "ON a.scenario_id = pr.scenario_id AND a.date >= pr.period_date "
+                "AND (pr.next_date IS NULL OR a.date < pr.next_date) "
+                "GROUP BY 1, 2), "
+                "forecast AS ("
+                "SELECT scenario_id, update_period, sum(demand) AS demand, "
+                "sum(revenue) AS revenue "
+                f"FROM {qn(cm.MarkdownScenarioKPI._meta.db_table)} "
+                "WHERE scenario_id = ANY(%s) AND NOT after_season "
+                "AND NOT read_and_react GROUP BY 1, 2) "
+                f"INSERT INTO {summary_table} (scenario_id, update_period, "
+                "period_date, forecast_demand, forecast_revenue, actual_units, "
+                "actual_revenue, demand_delta, revenue_delta, markdown_spend, "
+                "gross_profit, sell_through, cumulative_forecast_demand, "
+                "cumulative_actual_units, created_at, updated_at) "
+                "SELECT pr.scenario_id, pr.update_period, pr.period_date, "
+                "f.demand, f.revenue, a.units, a.revenue, "
+                "a.units - f.demand, a.revenue - f.revenue, "
+                "a.markdown_spend, a.gross_profit, a.sell_through, "
+                "sum(f.demand) OVER w, "
+                "CASE WHEN pr.period_date <= l.last_date "
+                "THEN coalesce(sum(a.units) OVER w, 0) END, now(), now() "
+                "FROM periods pr "
+                "LEFT JOIN forecast f USING (scenario_id, update_period) "
+                "LEFT JOIN actuals a USING (scenario_id, update_period) "
+                "LEFT JOIN loaded l ON l.scenario_id = pr.scenario_id "
+                "WINDOW w AS (PARTITION BY pr.scenario_id "
+                "ORDER BY pr.period_date, pr.update_period) "
+                "ON CONFLICT (scenario_id, update_period) DO UPDATE SET "
+                "period_date = excluded.period_date, "
+                "forecast_demand = excluded.forecast_demand, "
+                "forecast_revenue = excluded.forecast_revenue, "
+                "actual_units = excluded.actual_units, "
+                "actual_revenue = excluded.actual_revenue, "
+                "demand_delta = excluded.demand_delta, "
+                "revenue_delta = excluded.revenue_delta, "
+                "markdown_spend = excluded.markdown_spend, "
+                "gross_profit = excluded.gross_profit, "
+                "sell_through = excluded.sell_through, "
+                "cumulative_forecast_demand = excluded.cumulative_forecast_demand, "
+                "cumulative_actual_units = excluded.cumulative_actual_units, "
+                "updated_at = now()",
+                [scenario_ids, scenario_ids, scenario_ids],
+            )
+            count = cursor.rowcount
+            cursor.execute(
+                f"DELETE FROM {summary_table} r "
+                f"USING {qn(cm.MarkdownScenario._meta.db_table)} s "
+                "WHERE r.scenario_id = s.id AND s.id = ANY(%s) "
+                "AND r.update_period > jsonb_array_length("
+                "coalesce(s.update_periods, '[]'::jsonb))",
+                [scenario_ids],
+            )
+        return count
+
+
+class MarkdownScenarioReadAndReactSummary(core_mixins.TimeStampMixin, models.Model):
+    """
+    Hold forecast vs actual sales per markdown scenario update period.
+    Rebuilt nightly by `MarkdownScenarioReadAndReactSummary.objects.refresh`.
+    """
+
+    objects = MarkdownScenarioReadAndReactManager()
+
+    scenario = models.ForeignKey(
+        "core.MarkdownScenario",
+        on_delete=models.CASCADE,
+        related_name="read_and_react_summary",
+    )
+    update_period = models.IntegerField()
+    period_date = models.DateField(null=True, blank=True)
+
+    forecast_demand = models.FloatField(null=True, blank=True)
+    forecast_revenue = models.FloatField(null=True, blank=True)
+    actual_units = models.IntegerField(null=True, blank=True)
+    actual_revenue = models.FloatField(null=True, blank=True)
+    demand_delta = models.FloatField(null=True, blank=True)
+    revenue_delta = models.FloatField(null=True, blank=True)
+
+    markdown_spend = models.DecimalField(
+        decimal_places=2, max_digits=12, null=True, blank=True
+    )
+    gross_profit = models.DecimalField(
+        decimal_places=2, max_digits=12, null=True, blank=True
+    )
+    # Last reported sell-through within the period.
+    sell_through = models.FloatField(null=True, blank=True)
+    cumulative_forecast_demand = models.FloatField(null=True, blank=True)
+    cumulative_actual_units = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ("scenario", "update_period")
+        ordering = ["scenario", "update_period"]
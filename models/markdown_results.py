@@ -0,0 +1,206 @@
+import io
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+
+from core import models as cm
+from core.models import partitioning
+from core.models.bulk import (
+    copy_csv,
+    create_staging_table,
+    qn,
+    read_csv_header,
+)
+
+KEY_COLUMNS = (
+    "markdownscenarioscope_id",
+    "store_cluster",
+    "update_period",
+)
+
+RESULT_COLUMNS = KEY_COLUMNS + (
+    "base_price",
+    "discount_percentage",
+    "discounted_price",
+    "after_season",
+    "revenue",
+    "demand",
+    "margin",
+    "second_margin",
+    "per_start_stock",
+)
+
+STAGING_TABLE = "markdown_results_staging"
+
+
+class MarkdownResultsLoader:
+    """
+    Load optimizer output for a markdown scenario into
+    `MarkdownScenarioRecommendedPrice`.
+
+    The result file (CSV, or Parquet when `pyarrow` is installed) is streamed
+    through COPY into a staging table, validated against the scenario's scope,
+    and swapped in for the previous recommendations of the same
+    `read_and_react` variant inside a single transaction. Readers keep seeing
+    the previous grid until the swap commits.
+    """
+
+    def __init__(self, scenario, read_and_react=False):
+        self.scenario = scenario
+        self.read_and_react = read_and_react
+
+    def load(self, path):
+        """
+        Load the result file at `path` and return the number of rows written.
+        The KPIs and effective prices commit together with the new results.
+        """
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT id FROM {qn(cm.MarkdownScenario._meta.db_table)} "
+                "WHERE id = %s FOR UPDATE",
+                [self.scenario.id],
+            )
+            create_staging_table(
+                cursor,
+                STAGING_TABLE,
+                cm.MarkdownScenarioRecommendedPrice._meta.db_table,
+                RESULT_COLUMNS,
+            )
+            if str(path).endswith(".parquet"):
+                self._copy_parquet(cursor, path)
+            else:
+                with open(path, newline="") as stream:
+                    copy_csv(cursor, STAGING_TABLE, self._columns(stream), stream)
+
+            self.validate(cursor)
+            count = self.swap(cursor)
+        return count
+
+    def refresh(self, recommended=None):
+        """
+        Refresh the KPIs and, for hot scenarios, the effective prices derived
+        from the recommendations, read from `recommended` when given.
+        """
+        cm.MarkdownScenarioKPI.objects.refresh(
+            self.scenario, self.read_and_react, recommended=recommended
+        )
+        effective = cm.MarkdownScenarioEffectivePrice.objects
+        if effective.filter(scenario=self.scenario).exists():
+            effective.refresh([self.scenario.id], recommended=recommended)
+
+    @staticmethod
+    def _columns(stream):
+        columns = read_csv_header(stream)
+        unknown = set(columns) - set(RESULT_COLUMNS)
+        missing = set(KEY_COLUMNS) - set(columns)
+        if unknown or missing:
+            raise ValidationError(
+                f"Invalid result columns: unknown {sorted(unknown)}, "
+                f"missing {sorted(missing)}"
+            )
+        return columns
+
+    def _copy_parquet(self, cursor, path):
+        try:
+            import pyarrow.csv as pa_csv
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("pyarrow is required to load Parquet result files")
+
+        for batch in pq.ParquetFile(path).iter_batches():
+            buffer = io.BytesIO()
+            pa_csv.write_csv(batch, buffer)
+            stream = io.TextIOWrapper(io.BytesIO(buffer.getvalue()), newline="")
+            copy_csv(cursor, STAGING_TABLE, self._columns(stream), stream)
+
+    def validate(self, cursor):
+        """
+        Reject the load if any staged row references a scope outside the
+        scenario, an update period the scenario does not have, or repeats a
+        (scope, store_cluster, update_period) key.
+        """
+        scope_table = qn(cm.MarkdownScenarioScope._meta.db_table)
+        cursor.execute(
+            f"SELECT count(*) FROM {qn(STAGING_TABLE)} s "
+            f"LEFT JOIN {scope_table} sc ON sc.id = s.markdownscenarioscope_id "
+            "AND sc.scenario_id = %s WHERE sc.id IS NULL",
+            [self.scenario.id],
+        )
+        (unknown_scopes,) = cursor.fetchone()
+
+        cursor.execute(
+            f"SELECT count(*) FROM {qn(STAGING_TABLE)} "
+            "WHERE update_period < 1 OR update_period > CASE "
+            "WHEN coalesce(after_season, false) THEN %s ELSE %s END",
+            [
+                len(self.scenario.after_season_update_periods or []),
+                len(self.scenario.update_periods or []),
+            ],
+        )
+        (bad_periods,) = cursor.fetchone()
+
+        cursor.execute(
+            "SELECT count(*) FROM ("
+            f"SELECT 1 FROM {qn(STAGING_TABLE)} "
+            f"GROUP BY {', '.join(KEY_COLUMNS)} HAVING count(*) > 1) d"
+        )
+        (duplicates,) = cursor.fetchone()
+
+        errors = []
+        if unknown_scopes:
+            errors.append(f"{unknown_scopes} rows reference scopes outside scenario")
+        if bad_periods:
+            errors.append(f"{bad_periods} rows reference unknown update periods")
+        if duplicates:
+            errors.append(f"{duplicates} duplicated result keys")
+        if errors:
+            raise ValidationError(errors)
+
+    def swap(self, cursor):
+        """
+        Replace the scenario's recommendations for this `read_and_react`
+        variant with the staged rows.
+
+        When the price table is partitioned, a fresh partition is built from
+        the staged rows plus the other variant's current rows and attached in
+        place of the old one. Otherwise the variant's rows are deleted and
+        re-inserted. Derived KPIs and effective prices are refreshed before
+        the partition swap, from the fresh partition, so that the swap's
+        table lock is still taken last and held only briefly.
+        """
+        model = cm.MarkdownScenarioRecommendedPrice
+        price_table = qn(model._meta.db_table)
+        scope_table = qn(cm.MarkdownScenarioScope._meta.db_table)
+        columns = ", ".join(c for c in RESULT_COLUMNS if c != "after_season")
+
+        if partitioning.is_partitioned(model):
+            target = partitioning.create_swap_table(cursor, model, self.scenario.id)
+            cursor.execute(
+                f"INSERT INTO {qn(target)} SELECT * FROM {price_table} "
+                "WHERE scenario_id = %s AND read_and_react <> %s",
+                [self.scenario.id, self.read_and_react],
+            )
+        else:
+            target = model._meta.db_table
+            cursor.execute(
+                f"DELETE FROM {price_table} p USING {scope_table} sc "
+                "WHERE p.markdownscenarioscope_id = sc.id "
+                "AND sc.scenario_id = %s AND p.read_and_react = %s",
+                [self.scenario.id, self.read_and_react],
+            )
+
+        cursor.execute(
+            f"INSERT INTO {qn(target)} ({columns}, after_season, read_and_react, "
+            "scenario_id, created_at, updated_at) "
+            f"SELECT {columns}, coalesce(after_season, false), %s, %s, now(), now() "
+            f"FROM {qn(STAGING_TABLE)}",
+            [self.read_and_react, self.scenario.id],
+        )
+        count = cursor.rowcount
+
+        if target != model._meta.db_table:
+            self.refresh(recommended=target)
+            partitioning.swap_partition(cursor, model, self.scenario.id, target)
+        else:
+            self.refresh()
+        return count
@@ -1,7 +1,13 @@
+import copy
+
 from django.contrib.postgres.fields import ArrayField
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Q
+from django.db.models.functions import Now
 from core.models import mixins as core_mixins
+from core.models import partitioning
+from core.models.markdown_store_cluster import MarkdownScenarioStoreCluster
 from django.utils import timezone
 from core.utils.ordered_enum import OrderedEnum
 
@@ -137,9 +143,71 @@ class MarkdownScenarioScope(models.Model):
             "event",
             "article",
         )
+        # article -> scenario dependency index used by `flag_outdated`.
+        indexes = [
+            models.Index(fields=["article", "scenario"]),
+            models.Index(fields=["clone_article", "scenario"]),
+        ]
+
+
+class MarkdownScenarioQuerySet(models.QuerySet):
+    def affected_by(self, article_ids=(), plns=(), event_ids=()):
+        """
+        Scenarios depending on any of the given articles (by id or pln, as a
+        scoped or a clone article) or on any of the given events.
+        """
+        article_ids, plns, event_ids = list(article_ids), list(plns), list(event_ids)
+        scopes = MarkdownScenarioScope.objects.filter(
+            Q(article_id__in=article_ids)
+            | Q(clone_article_id__in=article_ids)
+            | Q(article__pln__in=plns)
+            | Q(clone_article__pln__in=plns)
+        ).values("scenario_id")
+        return self.filter(Q(event_id__in=event_ids) | Q(id__in=scopes))
+
+    def flag_outdated(self, article_ids=(), plns=(), event_ids=()):
+        """
+        Flag every non-archived scenario affected by an upstream change (e.g.
+        article master data, cost or current price reloads, event scope edits)
+        as outdated in a single UPDATE, stamping `last_modified` with when it
+        went stale. Returns the number of newly flagged scenarios.
+        """
+        return (
+            self.affected_by(article_ids, plns, event_ids)
+            .filter(is_outdated=False)
+            .exclude(status=MarkdownScenarioStatus.ARCHIVED)
+            .update(is_outdated=True, last_modified=Now())
+        )
+
+
+class OutdatedScenarioFlag:
+    """
+    On-commit callback flagging the scenarios affected by the articles (by
+    pln) whose inputs changed during the transaction, in one UPDATE.
+    """
+
+    def __init__(self):
+        self.plns = set()
+
+    def add(self, plns):
+        self.plns.update(pln for pln in plns if pln is not None)
+
+    def __call__(self):
+        MarkdownScenario.objects.flag_outdated(plns=sorted(self.plns))
+
+
+# Large JSON payloads of a scenario, left out of scenario queries by default.
+CLUSTER_PAYLOADS = ("store_cluster", "store_cluster_data")
+
+
+class MarkdownScenarioManager(models.Manager.from_queryset(MarkdownScenarioQuerySet)):
+    def get_queryset(self):
+        # Loaded on first access, or with `.values()` when needed in bulk.
+        return super().get_queryset().defer(*CLUSTER_PAYLOADS)
 
 
 class MarkdownScenario(core_mixins.TimeStampMixin, models.Model):
+    objects = MarkdownScenarioManager()
 
     id = models.AutoField(primary_key=True)
     event = models.ForeignKey(
@@ -206,17 +274,54 @@ class MarkdownScenario(core_mixins.TimeStampMixin, models.Model):
 
     constraints = models.JSONField(default=list, null=True, blank=True)
 
+    last_modified = models.DateTimeField(default=timezone.now)
+
+    is_outdated = models.BooleanField(default=False)
+
+    # Loaded on first access; see `MarkdownScenarioManager`.
     store_cluster = models.JSONField(default=dict, null=True, blank=True)
 
     store_cluster_data = models.JSONField(default=list, null=True, blank=True)
 
-    last_modified = models.DateTimeField(default=timezone.now)
-
-    is_outdated = models.BooleanField(default=False)
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot_cluster_data()
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._snapshot_cluster_data()
+
+    def _snapshot_cluster_data(self):
+        """
+        Remember the loaded `store_cluster_data` and the row it came from, so
+        save() can tell whether it changed, including in-place edits.
+        """
+        self._loaded_pk = self.pk
+        if "store_cluster_data" in self.__dict__:
+            self._loaded_cluster_data = copy.deepcopy(self.store_cluster_data)
+
+    def _cluster_data_changed(self, update_fields):
+        if "store_cluster_data" not in self.__dict__:
+            return False
+        if update_fields is not None and "store_cluster_data" not in update_fields:
+            return False
+        if self._state.adding or not hasattr(self, "_loaded_cluster_data"):
+            return True
+        return self.store_cluster_data != self._loaded_cluster_data
 
     @property
     def store_cluster_file_uploaded(self):
-        return self.store_cluster_data != [] and self.store_cluster_data is not None
+        if "store_cluster_data" in self.__dict__:
+            return self.store_cluster_data not in ([], None)
+        return (
+            type(self)
+            ._base_manager.filter(pk=self.pk)
+            .exclude(store_cluster_data__isnull=True)
+            .exclude(store_cluster_data=[])
+            .exists()
+        )
 
     @property
     def total_update_period_dates(self):
@@ -246,6 +351,39 @@ class MarkdownScenario(core_mixins.TimeStampMixin, models.Model):
 
         return update_periods + after_season_update_periods
 
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        loaded_pk = getattr(self, "_loaded_pk", None)
+        if self.pk is None and loaded_pk is not None:
+            # A copy of a loaded scenario: fetch the payloads it never loaded,
+            # which would otherwise be saved as their defaults.
+            deferred = [n for n in CLUSTER_PAYLOADS if n not in self.__dict__]
+            if deferred:
+                for name, value in (
+                    type(self)._base_manager.filter(pk=loaded_pk)
+                    .values(*deferred)
+                    .get()
+                    .items()
+                ):
+                    setattr(self, name, value)
+        rebuild = self._cluster_data_changed(kwargs.get("update_fields"))
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                partitioning.ensure_scenario_partitions(self.id)
+            if rebuild:
+                MarkdownScenarioStoreCluster.objects.rebuild(
+                    self, self.store_cluster_data
+                )
+        self._snapshot_cluster_data()
+
+    def delete(self, *args, **kwargs):
+        # Drop the price partitions up front so the cascade does not have to
+        # delete them row by row.
+        with transaction.atomic():
+            partitioning.drop_scenario_partitions(self.id)
+            return super().delete(*args, **kwargs)
+
     def __str__(self):
         return str(self.name)
 
@@ -0,0 +1,89 @@
+from django.db import models, transaction
+
+STORE_KEYS = ("store_id", "store", "store_number")
+CLUSTER_KEYS = ("store_cluster", "cluster")
+
+
+def _first(entry, keys):
+    for key in keys:
+        if entry.get(key) not in (None, ""):
+            return entry[key]
+    return None
+
+
+def store_cluster_pairs(store_cluster_data):
+    """
+    Extract (store_id, store_cluster) pairs from uploaded cluster rows,
+    skipping rows that carry no usable store or cluster number.
+    """
+    for entry in store_cluster_data or []:
+        if not isinstance(entry, dict):
+            continue
+        store, cluster = _first(entry, STORE_KEYS), _first(entry, CLUSTER_KEYS)
+        try:
+            yield int(store), int(cluster)
+        except (TypeError, ValueError):
+            continue
+
+
+class MarkdownScenarioStoreClusterManager(models.Manager):
+    def rebuild(self, scenario, store_cluster_data):
+        """
+        Replace the store -> cluster rows of a scenario from its uploaded
+        cluster data.
+        """
+        with transaction.atomic():
+            self.filter(scenario=scenario).delete()
+            self.bulk_create(
+                [
+                    self.model(
+                        scenario=scenario, store_id=store, store_cluster=cluster
+                    )
+                    for store, cluster in dict(
+                        store_cluster_pairs(store_cluster_data)
+                    ).items()
+                ],
+                batch_size=5000,
+            )
+
+    def lookup(self, scenario, store_ids):
+        """
+        Map many store ids to their cluster in one query. Stores without a
+        cluster are absent from the result.
+        """
+        return dict(
+            self.filter(scenario=scenario, store_id__in=list(store_ids)).values_list(
+                "store_id", "store_cluster"
+            )
+        )
+
+    def stores(self, scenario, store_clusters):
+        """
+        Return {store_cluster: [store_id, ...]} for the given clusters.
+        """
+        result = {}
+        for store, cluster in (
+            self.filter(scenario=scenario, store_cluster__in=list(store_clusters))
+            .order_by("store_id")
+            .values_list("store_id", "store_cluster")
+        ):
+            result.setdefault(cluster, []).append(store)
+        return result
+
+
+class MarkdownScenarioStoreCluster(models.Model):
+    """Hold the store to cluster assignment of a markdown scenario"""
+
+    objects = MarkdownScenarioStoreClusterManager()
+
+    scenario = models.ForeignKey(
+        "core.MarkdownScenario",
+        on_delete=models.CASCADE,
+        related_name="store_clusters",
+    )
+    store_id = models.IntegerField()
+    store_cluster = models.IntegerField()
+
+    class Meta:
+        unique_together = ("scenario", "store_id")
+        indexes = [models.Index(fields=["scenario", "store_cluster"])]
@@ -0,0 +1,205 @@
+import hashlib
+import json
+from dataclasses import dataclass, field
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from core import models as cm
+from core.models.reference_data_version import REFERENCE_DATA_SENDERS
+
+# Models in load order, parents before children, with their natural key.
+SYNC_ORDER = (
+    ("GMM", "gmm_id"),
+    ("MerchDivision", "mdse_div_id"),
+    ("DMM", "dmm_id"),
+    ("CM", "cm_id"),
+    ("OpStudy", "opstudy_id"),
+    ("ProductCategory", "prod_cat_id"),
+    ("Article", "pln"),
+)
+NATURAL_KEYS = dict(SYNC_ORDER)
+
+# Not part of the extracts, so left out of the content hash.
+IGNORED_FIELDS = {"id", "created_at", "updated_at", "content_hash"}
+
+# Sent once per model with the natural keys of the rows created and updated.
+master_data_changed = Signal()
+
+
+def content_hash(values):
+    payload = json.dumps(values, default=str, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+@dataclass
+class MasterDataSyncResult:
+    created: dict = field(default_factory=dict)
+    updated: dict = field(default_factory=dict)
+    unchanged: dict = field(default_factory=dict)
+    errors: list = field(default_factory=list)
+
+    def changed(self, name):
+        return self.created.get(name, []) + self.updated.get(name, [])
+
+
+class MasterDataSync:
+    """
+    Load full article and merchandise hierarchy extracts, writing only rows
+    that are new or whose content hash changed.
+
+    Extract rows are dicts keyed by model field name. Foreign keys hold the
+    parent's natural id (e.g. a DMM row's "gmm" is a `gmm_id`), which is why
+    parents are synced before their children. Rows whose parent is unknown are
+    skipped and reported in `errors`. Fields missing from an extract are left
+    as stored.
+
+    Rows synced before `content_hash` existed are rewritten once.
+    """
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+
+    def run(self, extracts):
+        """
+        Sync `extracts`, a dict of model name (e.g. "Article") to rows, in
+        one transaction, then invalidate what depends on the changed rows.
+        """
+        result = MasterDataSyncResult()
+        with transaction.atomic():
+            for name, key in SYNC_ORDER:
+                if name in extracts:
+                    self._sync(getattr(cm, name), key, extracts[name], result)
+            self._invalidate(result)
+        for name, _ in SYNC_ORDER:
+            if result.changed(name):
+                master_data_changed.send(
+                    sender=getattr(cm, name),
+                    created=result.created[name],
+                    updated=result.updated[name],
+                )
+        return result
+
+    def _parent_ids(self, fields):
+        """
+        Natural id -> stored value of the parents of each foreign key to a
+        synced model: the pk for hierarchy FKs, the natural id itself for
+        `to_field` FKs such as the article's.
+        """
+        parents = {}
+        for f in fields:
+            parent = f.related_model if f.is_relation else None
+            if parent is None or parent.__name__ not in NATURAL_KEYS:
+                continue
+            natural = parent._meta.get_field(NATURAL_KEYS[parent.__name__])
+            if f.target_field == natural:
+                ids = parent.objects.values_list(natural.attname, flat=True)
+                parents[f.name] = natural, {value: value for value in ids}
+            else:
+                ids = parent.objects.values_list(natural.attname, "id")
+                parents[f.name] = natural, dict(ids)
+        return parents
+
+    def _values(self, fields, parents, row):
+        """
+        Stored values of the fields present in `row`, by attname.
+        """
+        values = {}
+        for f in fields:
+            if f.name not in row:
+                continue
+            value = row[f.name]
+            if value is not None and f.name in parents:
+                natural, ids = parents[f.name]
+                value = natural.to_python(value)
+                if value not in ids:
+                    raise ValidationError(f"unknown {f.name} {value}")
+                value = ids[value]
+            elif value is not None:
+                value = (f.target_field if f.is_relation else f).to_python(value)
+            values[f.attname] = value
+        return values
+
+    def _sync(self, model, key, rows, result):
+        name = model.__name__
+        rows = list(rows)
+        fields = [
+            f for f in model._meta.concrete_fields if f.attname not in IGNORED_FIELDS
+        ]
+        # Fields missing from (some) extract rows keep their stored value, or
+        # their default for new rows, and are only written where present.
+        present = [f for f in fields if any(f.name in row for row in rows)]
+        absent = [f.attname for f in fields if any(f.name not in row for row in rows)]
+        parents = self._parent_ids(present)
+        existing = {
+            k: (pk, digest)
+            for k, pk, digest in model.objects.values_list(key, "id", "content_hash")
+        }
+        stored = {}
+        if absent:
+            stored = {v[key]: v for v in model.objects.values(key, *absent)}
+
+        incoming = {}
+        for row in rows:
+            try:
+                if row.get(key) is None:
+                    raise ValidationError(f"missing {key}")
+                values = self._values(fields, parents, row)
+            except ValidationError as e:
+                result.errors.append(
+                    {"model": name, "key": row.get(key), "message": "; ".join(e)}
+                )
+                continue
+            current = stored.get(values[key], {})
+            for f in fields:
+                if f.attname not in values:
+                    values[f.attname] = current.get(f.attname, f.get_default())
+            incoming[values[key]] = values
+
+        now = timezone.now()
+        create, update = [], []
+        for k, values in incoming.items():
+            digest = content_hash([values[f.attname] for f in fields])
+            current = existing.get(k)
+            if current is None:
+                create.append(model(content_hash=digest, **values))
+            elif current[1] != digest:
+                update.append(
+                    model(id=current[0], content_hash=digest, updated_at=now, **values)
+                )
+
+        model.objects.bulk_create(create, batch_size=self.batch_size)
+        model.objects.bulk_update(
+            update,
+            [f.name for f in present] + ["content_hash", "updated_at"],
+            batch_size=self.batch_size,
+        )
+        result.created[name] = [getattr(obj, key) for obj in create]
+        result.updated[name] = [getattr(obj, key) for obj in update]
+        result.unchanged[name] = len(incoming) - len(create) - len(update)
+
+    def _invalidate(self, result):
+        """
+        Bulk writes send no model signals, so do here what the post_save
+        handlers would: bump reference data versions, resync UPCs of updated
+        articles (created ones are synced by `ArticleQuerySet.bulk_create`),
+        rebuild the hierarchy closure and flag affected markdown scenarios.
+        """
+        changed = [name for name, _ in SYNC_ORDER if result.changed(name)]
+        if not changed:
+            return
+        cm.ReferenceDataVersion.objects.bump(
+            *{REFERENCE_DATA_SENDERS[f"core.{name}"] for name in changed}
+        )
+        if any(name != "Article" for name in changed):
+            cm.MerchHierarchyClosure.objects.rebuild()
+        plns = result.changed("Article")
+        if plns:
+            cm.ArticleUPC.objects.sync(
+                cm.Article.objects.filter(
+                    pln__in=result.updated["Article"]
+                ).values_list("id", flat=True)
+            )
+            cm.MarkdownScenario.objects.flag_outdated(plns=plns)
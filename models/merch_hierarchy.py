@@ -0,0 +1,273 @@
+from django.db import connection, models, transaction
+from django.db.models.signals import post_delete, post_save
+
+from core import models as cm
+from core.models.bulk import defer_on_commit, qn
+
+
+class MerchHierarchyLevel(models.TextChoices):
+    MDSEDIV = "MDSEDIV"
+    GMM = "GMM"
+    DMM = "DMM"
+    CM = "CM"
+    OPSTUDY = "OPSTUDY"
+
+
+# level -> (model, natural key), and the Article column holding that level
+LEVELS = {
+    MerchHierarchyLevel.MDSEDIV: ("MerchDivision", "mdse_div_id", "mdse_div_id"),
+    MerchHierarchyLevel.GMM: ("GMM", "gmm_id", "gmm_id"),
+    MerchHierarchyLevel.DMM: ("DMM", "dmm_id", "dmm_id"),
+    MerchHierarchyLevel.CM: ("CM", "cm_id", "cm_id"),
+    MerchHierarchyLevel.OPSTUDY: ("OpStudy", "opstudy_id", "opstudy_id"),
+}
+
+# (parent level, child level, child FK column to the parent's pk)
+EDGES = (
+    (MerchHierarchyLevel.MDSEDIV, MerchHierarchyLevel.DMM, "mdse_div_id"),
+    (MerchHierarchyLevel.GMM, MerchHierarchyLevel.DMM, "gmm_id"),
+    (MerchHierarchyLevel.DMM, MerchHierarchyLevel.CM, "dmm_id"),
+    (MerchHierarchyLevel.CM, MerchHierarchyLevel.OPSTUDY, "cm_id"),
+)
+
+
+def _table(level):
+    return qn(getattr(cm, LEVELS[level][0])._meta.db_table)
+
+
+def _nodes_sql():
+    return " UNION ALL ".join(
+        f"SELECT '{level}'::text AS level, {key} AS node FROM {_table(level)}"
+        for level, (_, key, _) in LEVELS.items()
+    )
+
+
+def _edges_sql():
+    return " UNION ALL ".join(
+        f"SELECT '{parent}'::text AS parent_level, p.{LEVELS[parent][1]} "
+        f"AS parent, '{child}'::text AS child_level, c.{LEVELS[child][1]} "
+        f"AS child FROM {_table(child)} c JOIN {_table(parent)} p "
+        f"ON p.id = c.{column}"
+        for parent, child, column in EDGES
+    )
+
+
+class ClosureRefresh:
+    """
+    On-commit callback rebuilding the closure below the (level, node id)
+    hierarchy nodes saved or deleted during the transaction.
+    """
+
+    def __init__(self):
+        self.nodes = set()
+
+    def add(self, nodes):
+        self.nodes.update(node for node in nodes if None not in node)
+
+    def __call__(self):
+        MerchHierarchyClosure.objects.rebuild_subtrees(sorted(self.nodes))
+
+
+class MerchHierarchyClosureManager(models.Manager):
+    def rebuild(self):
+        """
+        Recompute the closure of the hierarchy parent links in one recursive
+        query. The hierarchy tables are small, so the closure is replaced
+        wholesale.
+        """
+        table = qn(self.model._meta.db_table)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {table}")
+            cursor.execute(
+                f"WITH RECURSIVE nodes AS ({_nodes_sql()}), "
+                f"edges AS ({_edges_sql()}), "
+                "closure (ancestor_level, ancestor_id, descendant_level, "
+                "descendant_id, depth) AS ("
+                "SELECT level, node, level, node, 0 FROM nodes "
+                "UNION SELECT c.ancestor_level, c.ancestor_id, e.child_level, "
+                "e.child, c.depth + 1 FROM closure c JOIN edges e "
+                "ON e.parent_level = c.descendant_level "
+                "AND e.parent = c.descendant_id) "
+                f"INSERT INTO {table} (ancestor_level, ancestor_id, "
+                "descendant_level, descendant_id, depth) "
+                "SELECT ancestor_level, ancestor_id, descendant_level, "
+                "descendant_id, min(depth) FROM closure GROUP BY 1, 2, 3, 4"
+            )
+            return cursor.rowcount
+
+    def rebuild_subtrees(self, nodes):
+        """
+        Recompute the ancestor rows of the given (level, node id) nodes and
+        of everything below them in the current closure, walking the parent
+        links upwards. Subtrees under ancestors that no longer exist (deleted
+        or renumbered nodes) are rebuilt too. Returns the number of rows
+        written.
+        """
+        nodes = list(nodes)
+        table = qn(self.model._meta.db_table)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"WITH nodes AS ({_nodes_sql()}) "
+                "SELECT DISTINCT h.descendant_level, h.descendant_id "
+                f"FROM {table} h WHERE (h.ancestor_level, h.ancestor_id) IN "
+                "(SELECT * FROM unnest(%s::text[], %s::integer[])) "
+                "OR NOT EXISTS (SELECT 1 FROM nodes n "
+                "WHERE n.level = h.ancestor_level AND n.node = h.ancestor_id)",
+                [[level for level, _ in nodes], [node for _, node in nodes]],
+            )
+            affected = sorted(set(nodes) | set(cursor.fetchall()))
+            if not affected:
+                return 0
+            params = [
+                [level for level, _ in affected],
+                [node for _, node in affected],
+            ]
+            cursor.execute(
+                f"DELETE FROM {table} WHERE (descendant_level, descendant_id) "
+                "IN (SELECT * FROM unnest(%s::text[], %s::integer[]))",
+                params,
+            )
+            cursor.execute(
+                f"WITH RECURSIVE nodes AS ({_nodes_sql()}), "
+                f"edges AS ({_edges_sql()}), "
+                "closure (ancestor_level, ancestor_id, descendant_level, "
+                "descendant_id, depth) AS ("
+                "SELECT n.level, n.node, n.level, n.node, 0 FROM nodes n "
+                "WHERE (n.level, n.node) IN "
+                "(SELECT * FROM unnest(%s::text[], %s::integer[])) "
+                "UNION SELECT e.parent_level, e.parent, c.descendant_level, "
+                "c.descendant_id, c.depth + 1 FROM closure c JOIN edges e "
+                "ON e.child_level = c.ancestor_level "
+                "AND e.child = c.ancestor_id) "
+                f"INSERT INTO {table} (ancestor_level, ancestor_id, "
+                "descendant_level, descendant_id, depth) "
+                "SELECT ancestor_level, ancestor_id, descendant_level, "
+                "descendant_id, min(depth) FROM closure GROUP BY 1, 2, 3, 4",
+                params,
+            )
+            return cursor.rowcount
+
+    def opstudies_under(self, level, node_id):
+        return self.filter(
+            ancestor_level=level,
+            ancestor_id=node_id,
+            descendant_level=MerchHierarchyLevel.OPSTUDY,
+        ).values("descendant_id")
+
+    def articles_under(self, level, node_id):
+        """
+        Articles below a hierarchy node, through their opstudy.
+        """
+        return cm.Article.objects.filter(
+            opstudy_id__in=self.opstudies_under(level, node_id)
+        )
+
+    def scopes_under(self, scope_model, level, node_id):
+        """
+        Markdown or pricing scenario scopes below a hierarchy node.
+        """
+        return scope_model.objects.filter(
+            article__opstudy_id__in=self.opstudies_under(level, node_id)
+        )
+
+    def markdown_rollup(self, scenario, level, read_and_react=False):
+        """
+        Recommended revenue, demand, margin and average discount of a markdown
+        scenario, aggregated to every node of `level` in one join.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT h.ancestor_id, sum(r.revenue), sum(r.demand), "
+                "sum(r.margin), sum(r.second_margin), "
+                "avg(r.discount_percentage) "
+                f"FROM {qn(cm.MarkdownScenarioRecommendedPrice._meta.db_table)} r "
+                f"JOIN {qn(cm.MarkdownScenarioScope._meta.db_table)} s "
+                "ON s.id = r.markdownscenarioscope_id "
+                f"JOIN {qn(cm.Article._meta.db_table)} a ON a.id = s.article_id "
+                f"JOIN {qn(self.model._meta.db_table)} h "
+                "ON h.descendant_level = %s AND h.descendant_id = a.opstudy_id "
+                "AND h.ancestor_level = %s "
+                "WHERE r.scenario_id = %s AND r.read_and_react = %s "
+                "GROUP BY h.ancestor_id ORDER BY h.ancestor_id",
+                [
+                    MerchHierarchyLevel.OPSTUDY,
+                    level,
+                    getattr(scenario, "id", scenario),
+                    read_and_react,
+                ],
+            )
+            columns = (
+                "node_id",
+                "revenue",
+                "demand",
+                "margin",
+                "second_margin",
+                "avg_discount",
+            )
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def inconsistencies(self):
+        """
+        Articles whose denormalized mdse_div, gmm, dmm or cm column does not
+        match an ancestor of their opstudy. Returns
+        (article id, pln, level, article value) tuples.
+        """
+        checks = " UNION ALL ".join(
+            f"SELECT a.id, a.pln, '{level}', a.{column} "
+            f"FROM {qn(cm.Article._meta.db_table)} a "
+            f"WHERE a.{column} IS NOT NULL AND NOT EXISTS ("
+            f"SELECT 1 FROM {qn(self.model._meta.db_table)} h "
+            f"WHERE h.ancestor_level = '{level}' "
+            f"AND h.ancestor_id = a.{column} "
+            f"AND h.descendant_level = '{MerchHierarchyLevel.OPSTUDY}' "
+            "AND h.descendant_id = a.opstudy_id)"
+            for level, (_, _, column) in LEVELS.items()
+            if level != MerchHierarchyLevel.OPSTUDY
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(checks + " ORDER BY 1")
+            return cursor.fetchall()
+
+
+class MerchHierarchyClosure(models.Model):
+    """
+    Closure table of the merchandise hierarchy (MerchDivision / GMM -> DMM ->
+    CM -> OpStudy) on natural ids: one row per ancestor/descendant pair,
+    including each node with itself at depth 0.
+    """
+
+    objects = MerchHierarchyClosureManager()
+
+    ancestor_level = models.CharField(
+        max_length=10, choices=MerchHierarchyLevel.choices
+    )
+    ancestor_id = models.IntegerField()
+    descendant_level = models.CharField(
+        max_length=10, choices=MerchHierarchyLevel.choices
+    )
+    descendant_id = models.IntegerField()
+    depth = models.IntegerField()
+
+    class Meta:
+        unique_together = (
+            "ancestor_level",
+            "ancestor_id",
+            "descendant_level",
+            "descendant_id",
+        )
+        indexes = [
+            models.Index(
+                fields=["descendant_level", "descendant_id", "ancestor_level"]
+            ),
+        ]
+
+
+def _refresh_closure(sender, instance, **kwargs):
+    for level, (model, key, _) in LEVELS.items():
+        if sender._meta.object_name == model:
+            defer_on_commit(ClosureRefresh, [(level, getattr(instance, key))])
+
+
+for _model, _, _ in LEVELS.values():
+    post_save.connect(_refresh_closure, sender=f"core.{_model}", weak=False)
+    post_delete.connect(_refresh_closure, sender=f"core.{_model}", weak=False)
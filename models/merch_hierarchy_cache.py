@@ -0,0 +1,116 @@
+import threading
+import time
+
+from core import models as cm
+from core.models.reference_data_version import ReferenceDataVersion
+
+# Reference data sets the cached dimensions are derived from.
+CACHE_REFERENCE_DATA = ("hierarchy", "zone")
+
+# child model -> (attribute holding the parent's pk, parent model name)
+PARENTS = {
+    "OpStudy": ("cm_id", "CM"),
+    "CM": ("dmm_id", "DMM"),
+    "DMM": ("gmm_id", "GMM"),
+}
+
+
+class MerchHierarchySnapshot:
+    """
+    Immutable in-memory copy of the merchandise hierarchy and zone dimensions,
+    with natural key maps and parent/child navigation.
+    """
+
+    def __init__(self, versions):
+        self.versions = versions
+        self.gmms = {g.gmm_id: g for g in cm.GMM.objects.all()}
+        self.dmms = {d.dmm_id: d for d in cm.DMM.objects.all()}
+        self.cms = {c.cm_id: c for c in cm.CM.objects.all()}
+        self.opstudies = {o.opstudy_id: o for o in cm.OpStudy.objects.all()}
+        self.mdse_divs = {d.mdse_div_id: d for d in cm.MerchDivision.objects.all()}
+        self.prod_cats = {p.prod_cat_id: p for p in cm.ProductCategory.objects.all()}
+        zones = list(cm.Zone.objects.all())
+        self.zones = {z.id: z for z in zones}
+        self.zones_by_code = {z.zone_code: z for z in zones}
+        self.zones_by_description = {z.zone_description: z for z in zones}
+        self.ob_roles = dict(cm.NBOBRole.objects.values_list("opstudy_id", "ob_role"))
+
+        self._by_pk = {}
+        for objects in (
+            self.gmms,
+            self.dmms,
+            self.cms,
+            self.opstudies,
+            self.mdse_divs,
+            self.prod_cats,
+        ):
+            for obj in objects.values():
+                self._by_pk[(type(obj).__name__, obj.pk)] = obj
+
+        self._children = {}
+        for obj in self._by_pk.values():
+            parent = self.parent(obj)
+            if parent is not None:
+                key = (type(parent).__name__, parent.pk)
+                self._children.setdefault(key, []).append(obj)
+
+    def parent(self, obj):
+        attname, parent_name = PARENTS.get(type(obj).__name__, (None, None))
+        if attname is None:
+            return None
+        return self._by_pk.get((parent_name, getattr(obj, attname)))
+
+    def ancestors(self, obj):
+        parent = self.parent(obj)
+        while parent is not None:
+            yield parent
+            parent = self.parent(parent)
+
+    def children(self, obj):
+        return self._children.get((type(obj).__name__, obj.pk), [])
+
+    def descendants(self, obj):
+        for child in self.children(obj):
+            yield child
+            yield from self.descendants(child)
+
+    def opstudy_ids_under(self, obj):
+        """
+        Natural ids of every OpStudy at or below a GMM, DMM, CM or OpStudy.
+        """
+        nodes = [obj, *self.descendants(obj)]
+        return [n.opstudy_id for n in nodes if isinstance(n, cm.OpStudy)]
+
+
+class MerchHierarchyCache:
+    """
+    Process-level cache of `MerchHierarchySnapshot`.
+
+    Every write to a cached dimension bumps a `ReferenceDataVersion`; each
+    process compares its snapshot's versions with the database at most every
+    `check_interval` seconds and reloads when another worker changed them.
+    """
+
+    def __init__(self, check_interval=5):
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        if self._snapshot is not None and now - self._checked_at < self.check_interval:
+            return self._snapshot
+        with self._lock:
+            versions = ReferenceDataVersion.objects.current(*CACHE_REFERENCE_DATA)
+            if self._snapshot is None or self._snapshot.versions != versions:
+                self._snapshot = MerchHierarchySnapshot(versions)
+            self._checked_at = now
+            return self._snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+
+
+merch_hierarchy = MerchHierarchyCache()
@@ -1,7 +1,209 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import connection, models, transaction
+from django.db.models.signals import post_save
+
+from core import models as cm
+from core.models.bulk import qn
+from core.models.markdown_effective_price import (
+    effective_price_params,
+    effective_price_sql,
+)
+from core.models.pricing_price_family import (
+    PricingPriceSource,
+    pricing_effective_price_params,
+    pricing_effective_price_sql,
+)
+
+
+class MinimumAdvertisedPriceManager(models.Manager):
+    def link_articles(self, plns=None):
+        """
+        Set `article` from `pln` in one UPDATE, for every row or only those of
+        the articles in `plns`. Returns the number of rows linked.
+        """
+        table = qn(self.model._meta.db_table)
+        where, params = "", []
+        if plns is not None:
+            where, params = " AND a.pln = ANY(%s)", [list(plns)]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} m SET article_id = a.id "
+                f"FROM {qn(cm.Article._meta.db_table)} a "
+                "WHERE a.pln = trim(m.pln) AND m.article_id IS DISTINCT FROM a.id"
+                + where,
+                params,
+            )
+            return cursor.rowcount
 
 
 class MinimumAdvertisedPrice(models.Model):
+    objects = MinimumAdvertisedPriceManager()
 
     pln = models.CharField(max_length=20)
     map = models.DecimalField(decimal_places=2, max_digits=10)
+    # Article matching `pln`; set on save.
+    article = models.ForeignKey(
+        "core.Article",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="minimum_advertised_prices",
+    )
+
+    class Meta:
+        indexes = [models.Index(fields=["pln"])]
+
+    def save(self, *args, **kwargs):
+        self.article_id = (
+            cm.Article.objects.filter(pln=self.pln.strip())
+            .values_list("id", flat=True)
+            .first()
+        )
+        super().save(*args, **kwargs)
+
+
+def _link_article_maps(sender, instance, created, update_fields=None, **kwargs):
+    if created or update_fields is None or "pln" in update_fields:
+        MinimumAdvertisedPrice.objects.link_articles([instance.pln])
+
+
+post_save.connect(_link_article_maps, sender="core.Article", weak=False)
+
+
+def _map_sql():
+    """Highest MAP per linked article"""
+    return (
+        "SELECT article_id, max(map) AS map "
+        f"FROM {qn(MinimumAdvertisedPrice._meta.db_table)} "
+        "WHERE article_id IS NOT NULL GROUP BY article_id"
+    )
+
+
+class MAPChecker:
+    """
+    Compare every effective price of a pricing or markdown scenario against
+    the articles' minimum advertised price in one query, and report or clamp
+    the prices below it.
+
+    Clamping writes overrides at the MAP: planned prices (CM planned prices
+    when those win) for pricing scenarios, and scope-level planned discounts
+    for markdown scenarios.
+    """
+
+    def __init__(self, scenario):
+        self.scenario = scenario
+        self.markdown = isinstance(scenario, cm.MarkdownScenario)
+
+    def _violations_sql(self):
+        if self.markdown:
+            scope = qn(cm.MarkdownScenarioScope._meta.db_table)
+            return (
+                "SELECT e.scenario_id, e.markdownscenarioscope_id, a.pln, "
+                "e.store_cluster, e.update_period, e.read_and_react, "
+                "e.after_season, e.base_price, e.discounted_price AS price, "
+                f"m.map, e.source FROM ({effective_price_sql()}) e "
+                f"JOIN {scope} s ON s.id = e.markdownscenarioscope_id "
+                f"JOIN {qn(cm.Article._meta.db_table)} a ON a.id = s.article_id "
+                f"JOIN ({_map_sql()}) m ON m.article_id = a.id "
+                "WHERE e.discounted_price < m.map",
+                effective_price_params([self.scenario.id]),
+            )
+        return (
+            "SELECT e.pricingscenarioscope_id, e.zone_id, a.pln, e.price, m.map, "
+            f"e.source FROM ({pricing_effective_price_sql()}) e "
+            f"JOIN {qn(cm.Article._meta.db_table)} a ON a.id = e.article_id "
+            f"JOIN ({_map_sql()}) m ON m.article_id = e.article_id "
+            "WHERE e.price < m.map",
+            pricing_effective_price_params(self.scenario.id),
+        )
+
+    def violations(self):
+        sql, params = self._violations_sql()
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            columns = [col[0] for col in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def check(self, max_errors=20):
+        """
+        Raise a ValidationError listing prices below MAP, e.g. before a
+        scenario is approved.
+        """
+        violations = self.violations()
+        if violations:
+            raise ValidationError(
+                [
+                    f"{v['pln']}: price {v['price']} is below MAP {v['map']}"
+                    for v in violations[:max_errors]
+                ]
+                + (
+                    [f"... and {len(violations) - max_errors} more"]
+                    if len(violations) > max_errors
+                    else []
+                )
+            )
+
+    def clamp(self, comments="Raised to minimum advertised price"):
+        """
+        Raise every price below MAP to the MAP. Returns the number of
+        overrides written.
+        """
+        sql, params = self._violations_sql()
+        with transaction.atomic(), connection.cursor() as cursor:
+            if self.markdown:
+                written = self._clamp_markdown(cursor, sql, params)
+            else:
+                written = self._clamp_pricing(cursor, sql, params, comments)
+        return written
+
+    def _clamp_markdown(self, cursor, sql, params):
+        planned = qn(cm.MarkdownScenarioPlannedPrice._meta.db_table)
+        cursor.execute(
+            f"INSERT INTO {planned} (scenario_id, markdownscenarioscope_id, "
+            "store_cluster, update_period, read_and_react, after_season, "
+            "base_price, discounted_price, discount_percentage, created_at, "
+            "updated_at) SELECT scenario_id, markdownscenarioscope_id, "
+            "store_cluster, update_period, read_and_react, after_season, "
+            "base_price, map, CASE WHEN base_price > 0 "
+            "THEN greatest(0, round(1 - map / base_price, 4))::float8 END, "
+            f"now(), now() FROM ({sql}) v "
+            "ON CONFLICT (scenario_id, store_cluster, markdownscenarioscope_id, "
+            "update_period, read_and_react) DO UPDATE "
+            "SET discounted_price = excluded.discounted_price, "
+            "discount_percentage = excluded.discount_percentage, "
+            "updated_at = now() RETURNING update_period, store_cluster",
+            params,
+        )
+        keys = set(cursor.fetchall())
+        written = cursor.rowcount
+        if written:
+            cm.MarkdownScenarioKPI.objects.refresh(self.scenario, keys=sorted(keys))
+        effective = cm.MarkdownScenarioEffectivePrice.objects
+        if written and effective.filter(scenario=self.scenario).exists():
+            effective.refresh([self.scenario.id])
+        return written
+
+    def _clamp_pricing(self, cursor, sql, params, comments):
+        planned = qn(cm.PricingPlannedPrice._meta.db_table)
+        cm_planned = qn(cm.PricingCMPlannedPrice._meta.db_table)
+        cursor.execute(
+            f"WITH v AS ({sql}) UPDATE {cm_planned} c SET price = v.map, "
+            "comments = %s, updated_at = now() FROM v "
+            "WHERE c.pricingscenarioscope_id = v.pricingscenarioscope_id "
+            "AND c.zone_id = v.zone_id "
+            f"AND v.source = '{PricingPriceSource.CMPLANNED}'",
+            params + [comments],
+        )
+        written = cursor.rowcount
+        cursor.execute(
+            f"INSERT INTO {planned} (pricingscenarioscope_id, zone_id, pln, "
+            "price, zone_differential, comments, created_at, updated_at) "
+            "SELECT pricingscenarioscope_id, zone_id, pln, map, false, %s, "
+            f"now(), now() FROM ({sql}) v "
+            f"WHERE v.source <> '{PricingPriceSource.CMPLANNED}' "
+            "ON CONFLICT (zone_id, pricingscenarioscope_id) DO UPDATE "
+            "SET price = excluded.price, comments = excluded.comments, "
+            "updated_at = now()",
+            [comments] + params,
+        )
+        return written + cursor.rowcount
@@ -12,6 +12,15 @@ class TimeStampMixin(models.Model):
         abstract = True
 
 
+class ContentHashMixin(models.Model):
+    # Hash of the row as last written by the master data sync, see
+    # core.models.master_data_sync.
+    content_hash = models.CharField(max_length=64, blank=True, default="")
+
+    class Meta:
+        abstract = True
+
+
 class MultiCreateModelMixin(CreateModelMixin):
     """
     Create a model instance.
@@ -1,10 +1,10 @@
 from bulk_update_or_create import BulkUpdateOrCreateQuerySet
 from django.db import models
 
-from core.models.mixins import TimeStampMixin
+from core.models.mixins import ContentHashMixin, TimeStampMixin
 
 
-class OpStudy(TimeStampMixin, models.Model):
+class OpStudy(ContentHashMixin, TimeStampMixin, models.Model):
     objects = BulkUpdateOrCreateQuerySet.as_manager()
 
     opstudy_id = models.IntegerField(unique=True)
@@ -0,0 +1,97 @@
+import json
+import zlib
+from dataclasses import asdict
+
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Sum, Window
+from django.utils import timezone
+
+from core.models.reference_data_version import ReferenceDataVersion
+from core.models.scope_upload import ParsedScopeFile
+
+# Reference data a parsed scope file was validated against.
+CACHE_REFERENCE_DATA = ("article", "zone")
+
+
+def reference_version():
+    versions = ReferenceDataVersion.objects.current(*CACHE_REFERENCE_DATA)
+    return ",".join(f"{name}:{versions[name]}" for name in CACHE_REFERENCE_DATA)
+
+
+class ParsedUploadCacheManager(models.Manager):
+    def fetch(self, content_hash, file_category):
+        """
+        Cached `ParsedScopeFile` for a payload hash and category, validated
+        against the current reference data, or None.
+        """
+        entry = self.filter(
+            content_hash=content_hash,
+            file_category=file_category,
+            reference_version=reference_version(),
+        ).first()
+        if entry is None:
+            return None
+        self.filter(pk=entry.pk).update(
+            hits=F("hits") + 1, last_used_at=timezone.now()
+        )
+        return ParsedScopeFile(**json.loads(zlib.decompress(entry.payload)))
+
+    def store(self, content_hash, parsed):
+        payload = zlib.compress(json.dumps(asdict(parsed)).encode())
+        try:
+            with transaction.atomic():
+                self.create(
+                    content_hash=content_hash,
+                    file_category=parsed.file_category,
+                    reference_version=reference_version(),
+                    payload=payload,
+                    size=len(payload),
+                )
+        except IntegrityError:
+            # Cached concurrently by another worker.
+            pass
+        self.evict()
+
+    def evict(self, max_bytes=None):
+        """
+        Drop entries validated against outdated reference data, then the least
+        recently used entries until the cache fits in `max_bytes` (setting
+        `PARSED_UPLOAD_CACHE_MAX_BYTES`, 512 MB by default).
+        """
+        if max_bytes is None:
+            max_bytes = getattr(
+                settings, "PARSED_UPLOAD_CACHE_MAX_BYTES", 512 * 1024 * 1024
+            )
+        self.exclude(reference_version=reference_version()).delete()
+        overflow = (
+            self.annotate(
+                cumulative=Window(Sum("size"), order_by=F("last_used_at").desc())
+            )
+            .values("pk", "cumulative")
+        )
+        stale = [row["pk"] for row in overflow if row["cumulative"] > max_bytes]
+        if stale:
+            self.filter(pk__in=stale).delete()
+
+
+class ParsedUploadCache(models.Model):
+    """
+    Hold validated, columnar scope files keyed by payload hash, so re-uploads
+    of the same file skip parsing and validation.
+    """
+
+    objects = ParsedUploadCacheManager()
+
+    content_hash = models.CharField(max_length=64)
+    file_category = models.CharField(max_length=100)
+    reference_version = models.CharField(max_length=100)
+    payload = models.BinaryField()
+    size = models.IntegerField()
+    hits = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ("content_hash", "file_category", "reference_version")
+        indexes = [models.Index(fields=["last_used_at"])]
@@ -0,0 +1,217 @@
+"""
+List partitioning of the markdown price tables by scenario.
+
+`MarkdownScenarioRecommendedPrice` and `MarkdownScenarioPlannedPrice` are
+partitioned on their denormalized `scenario_id`, one partition per scenario
+plus a default partition. Dropping or reloading a scenario's prices is then a
+partition detach/attach rather than a mass DELETE.
+
+The column is added by a migration in three steps: add `scenario` as a
+nullable column, fill it with `backfill_price_scenarios`, then make it NOT
+NULL. The tables are then converted by a migration calling
+`convert_to_partitioned`.
+Every helper below is a no-op while a table is still unpartitioned, so the
+models keep working on databases that have not been migrated yet.
+"""
+from django.db import connection
+
+from core import models as cm
+from core.models.bulk import qn
+
+_partitioned = {}
+
+
+def partitioned_models():
+    return [cm.MarkdownScenarioRecommendedPrice, cm.MarkdownScenarioPlannedPrice]
+
+
+def partition_name(model, scenario_id):
+    return f"{model._meta.db_table}_s{scenario_id}"
+
+
+def is_partitioned(model):
+    """
+    Whether the table of `model` is partitioned. Only a positive answer is
+    cached: a table is never converted back, while processes started before
+    `convert_to_partitioned` ran must notice the conversion.
+    """
+    table = model._meta.db_table
+    if table not in _partitioned:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p "
+                "JOIN pg_class c ON c.oid = p.partrelid "
+                "WHERE c.relname = %s AND pg_table_is_visible(c.oid))",
+                [table],
+            )
+            (partitioned,) = cursor.fetchone()
+        if not partitioned:
+            return False
+        _partitioned[table] = True
+    return True
+
+
+def ensure_scenario_partitions(scenario_id):
+    """
+    Create the price partitions for a scenario if they do not exist yet.
+    Called when a scenario is created, before any price row is written.
+    """
+    with connection.cursor() as cursor:
+        for model in partitioned_models():
+            if is_partitioned(model):
+                cursor.execute(
+                    "CREATE TABLE IF NOT EXISTS "
+                    f"{qn(partition_name(model, scenario_id))} "
+                    f"PARTITION OF {qn(model._meta.db_table)} "
+                    "FOR VALUES IN (%s)",
+                    [scenario_id],
+                )
+
+
+def drop_scenario_partitions(scenario_id):
+    """
+    Detach and drop every price partition of a scenario.
+    """
+    with connection.cursor() as cursor:
+        for model in partitioned_models():
+            if is_partitioned(model):
+                name = partition_name(model, scenario_id)
+                cursor.execute("SELECT to_regclass(%s)", [name])
+                if cursor.fetchone()[0] is not None:
+                    cursor.execute(
+                        f"ALTER TABLE {qn(model._meta.db_table)} "
+                        f"DETACH PARTITION {qn(name)}"
+                    )
+                    cursor.execute(f"DROP TABLE {qn(name)}")
+
+
+def create_swap_table(cursor, model, scenario_id):
+    """
+    Create an empty standalone table shaped like a partition of `model` for
+    `scenario_id`, ready to be filled and swapped in by `swap_partition`.
+    """
+    name = partition_name(model, scenario_id) + "_load"
+    cursor.execute(f"DROP TABLE IF EXISTS {qn(name)}")
+    cursor.execute(
+        f"CREATE TABLE {qn(name)} (LIKE {qn(model._meta.db_table)} "
+        "INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+    )
+    # LIKE does not copy identity columns; draw ids from the parent's
+    # sequence so they stay unique across partitions.
+    cursor.execute(
+        "SELECT pg_get_serial_sequence(%s, 'id')", [qn(model._meta.db_table)]
+    )
+    (sequence,) = cursor.fetchone()
+    if sequence is not None:
+        cursor.execute(
+            f"ALTER TABLE {qn(name)} ALTER COLUMN id "
+            "SET DEFAULT nextval(%s::regclass)",
+            [sequence],
+        )
+    # Lets ATTACH PARTITION skip the validation scan of the new table.
+    cursor.execute(
+        f"ALTER TABLE {qn(name)} ADD CONSTRAINT {qn(name + '_scenario')} "
+        "CHECK (scenario_id IS NOT NULL AND scenario_id = %s)",
+        [scenario_id],
+    )
+    return name
+
+
+def swap_partition(cursor, model, scenario_id, new_table):
+    """
+    Replace a scenario's partition of `model` with `new_table`. Must run inside
+    a transaction so readers see either the old or the new partition.
+
+    DETACH PARTITION locks the whole parent table in ACCESS EXCLUSIVE mode
+    until commit, so call this as the last statement of the transaction.
+    """
+    table = qn(model._meta.db_table)
+    name = partition_name(model, scenario_id)
+    cursor.execute("SELECT to_regclass(%s)", [name])
+    if cursor.fetchone()[0] is not None:
+        cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {qn(name)}")
+        cursor.execute(f"DROP TABLE {qn(name)}")
+    cursor.execute(f"ALTER TABLE {qn(new_table)} RENAME TO {qn(name)}")
+    cursor.execute(
+        f"ALTER TABLE {table} ATTACH PARTITION {qn(name)} FOR VALUES IN (%s)",
+        [scenario_id],
+    )
+
+
+def backfill_price_scenarios(apps, schema_editor):
+    """
+    Fill the denormalized `scenario_id` of the price tables from their scope.
+    Intended to be run from a `RunPython` migration between adding the
+    nullable column and making it NOT NULL; rows without a scope are deleted,
+    as they cannot be attributed to a scenario.
+    """
+    scope = qn(cm.MarkdownScenarioScope._meta.db_table)
+    with schema_editor.connection.cursor() as cursor:
+        for model in partitioned_models():
+            table = qn(model._meta.db_table)
+            cursor.execute(
+                f"UPDATE {table} p SET scenario_id = s.scenario_id FROM {scope} s "
+                "WHERE s.id = p.markdownscenarioscope_id "
+                "AND p.scenario_id IS DISTINCT FROM s.scenario_id"
+            )
+            cursor.execute(f"DELETE FROM {table} WHERE scenario_id IS NULL")
+
+
+def convert_to_partitioned(model, schema_editor):
+    """
+    Rebuild the table of `model` as a table LIST partitioned on scenario_id,
+    creating one partition per existing scenario. Intended to be run from a
+    `RunPython` migration after `scenario_id` has been backfilled.
+    """
+    table = model._meta.db_table
+    legacy = f"{table}_legacy"
+    # The legacy table's identity sequence is dropped along with it.
+    sequence = f"{table}_id_part_seq"
+    fields = {f.name: f.column for f in model._meta.local_fields}
+    unique = [fields[name] for name in model._meta.unique_together[0]]
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {qn(table)} RENAME TO {qn(legacy)}")
+        cursor.execute(
+            f"CREATE TABLE {qn(table)} (LIKE {qn(legacy)} INCLUDING DEFAULTS) "
+            "PARTITION BY LIST (scenario_id)"
+        )
+        # LIKE does not copy the identity of `id`; use a plain sequence, which
+        # swap tables created by `create_swap_table` can share.
+        cursor.execute(f"CREATE SEQUENCE {qn(sequence)} OWNED BY {qn(table)}.id")
+        cursor.execute(
+            f"ALTER TABLE {qn(table)} ALTER COLUMN id "
+            "SET DEFAULT nextval(%s::regclass)",
+            [sequence],
+        )
+        cursor.execute(
+            f"ALTER TABLE {qn(table)} ADD PRIMARY KEY (id, scenario_id), "
+            f"ADD UNIQUE ({', '.join(unique)})"
+        )
+        for field in model._meta.local_fields:
+            if field.is_relation:
+                cursor.execute(
+                    f"ALTER TABLE {qn(table)} ADD FOREIGN KEY ({field.column}) "
+                    f"REFERENCES {qn(field.related_model._meta.db_table)} (id) "
+                    "DEFERRABLE INITIALLY DEFERRED"
+                )
+                cursor.execute(f"CREATE INDEX ON {qn(table)} ({field.column})")
+        cursor.execute(
+            f"CREATE TABLE {qn(table + '_default')} PARTITION OF {qn(table)} DEFAULT"
+        )
+        cursor.execute(f"SELECT DISTINCT scenario_id FROM {qn(legacy)}")
+        for (scenario_id,) in cursor.fetchall():
+            cursor.execute(
+                f"CREATE TABLE {qn(partition_name(model, scenario_id))} "
+                f"PARTITION OF {qn(table)} FOR VALUES IN (%s)",
+                [scenario_id],
+            )
+        cursor.execute(f"INSERT INTO {qn(table)} SELECT * FROM {qn(legacy)}")
+        cursor.execute(
+            "SELECT setval(%s::regclass, "
+            f"coalesce((SELECT max(id) FROM {qn(table)}), 0) + 1, false)",
+            [sequence],
+        )
+        cursor.execute(f"DROP TABLE {qn(legacy)}")
+
+    _partitioned.pop(table, None)
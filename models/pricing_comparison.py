@@ -0,0 +1,226 @@
+from collections import defaultdict
+
+from django.db import connection
+
+from core import models as cm
+from core.models.bulk import qn
+from core.models.pricing_price_family import (
+    pricing_effective_price_params,
+    pricing_effective_price_sql,
+)
+
+# Numeric grid values compared as other - base.
+COMPARED_FIELDS = (
+    "suggested_price",
+    "total_gp",
+    "total_sales",
+    "total_units",
+    "sugg_primary_bpi",
+    "sugg_secondary_bpi",
+)
+# Violation flags compared for changes.
+COMPARED_FLAGS = (
+    "primary_index_violation",
+    "secondary_index_violation",
+    "ppu_violation",
+    "plg_violation",
+    "price_rounding_violation",
+    "zone_violation",
+)
+# Deltas summed by `PricingScenarioComparison.aggregate`.
+AGGREGATED_FIELDS = ("total_gp", "total_sales", "total_units")
+
+
+def _targets(side):
+    """
+    LATERAL subquery resolving the `side` ("primary" or "secondary") target
+    index range of a grid row, falling back from the scenario's zone target
+    to the zone default, the scenario's "all" zone target, the opstudy
+    default and the global default, as `ScenarioScopeZoneDetails.objects`
+    does. The min and max fall back independently.
+    """
+    scenario_targets = qn(cm.PriceIndexTarget._meta.db_table)
+    defaults = qn(cm.KVIIndexTarget._meta.db_table)
+    match = (
+        "kvi_class = g.kvi_class AND promo_status = g.promo_status "
+        f"AND primary_secondary = '{side}' "
+        f"AND competitor_type = lower(c.{side}_competitor)"
+    )
+    levels = (
+        f"{scenario_targets} WHERE scenario_id = g.scenario_id "
+        "AND opstudy_id = g.opstudy_id AND zone_ref_id = g.zone_id",
+        f"{defaults} WHERE opstudy_ref_id = g.opstudy_id "
+        "AND zone_ref_id = g.zone_id",
+        f"{scenario_targets} WHERE scenario_id = g.scenario_id "
+        "AND opstudy_id = g.opstudy_id AND zone = 'all'",
+        f"{defaults} WHERE opstudy_ref_id = g.opstudy_id AND zone = 'all'",
+        f"{defaults} WHERE opstudy = 'all' AND zone = 'all'",
+    )
+    candidates = " UNION ALL ".join(
+        f"SELECT {level} AS level, index_min, index_max FROM {source} AND {match}"
+        for level, source in enumerate(levels)
+    )
+    return (
+        "LEFT JOIN LATERAL (SELECT "
+        "(array_agg(t.index_min ORDER BY t.level) "
+        "FILTER (WHERE t.index_min IS NOT NULL))[1] AS index_min, "
+        "(array_agg(t.index_max ORDER BY t.level) "
+        "FILTER (WHERE t.index_max IS NOT NULL))[1] AS index_max "
+        f"FROM ({candidates}) t) {side}_target ON true"
+    )
+
+
+def _violation(side):
+    bpi, target = f"g.sugg_{side}_bpi", f"{side}_target"
+    return (
+        f"({bpi} IS NOT NULL AND {target}.index_min IS NOT NULL "
+        f"AND {target}.index_max IS NOT NULL "
+        f"AND ({bpi} > {target}.index_max OR {bpi} < {target}.index_min)) "
+        f"AS {side}_index_violation"
+    )
+
+
+def grid_sql():
+    """
+    SELECT returning a pricing scenario's grid at the (article, zone) level:
+    the article's keys and the compared fields and flags. Takes the
+    parameters built by `pricing_effective_price_params`.
+
+    Suggested prices come from `pricing_effective_price_sql`, and BPIs and
+    index violations are derived from them like `ScenarioScopeZoneDetails`
+    annotates them, over the same rows (zones with a recommended, current
+    and cost price).
+    """
+    details = qn(cm.ScenarioScopeZoneDetails._meta.db_table)
+    scope = qn(cm.PricingScenarioScope._meta.db_table)
+    weighting = qn(cm.CompetitorWeighting._meta.db_table)
+    aur = (
+        "sum(e.price * d.total_units) OVER w "
+        "/ nullif(sum(d.total_units) OVER w, 0)"
+    )
+    rows = (
+        "SELECT e.article_id, d.zone_id, s.scenario_id, a.pln, a.opstudy_id, "
+        "a.cm_id, lower(coalesce(k.kvi_class, 'non-kvi')) AS kvi_class, "
+        "lower(coalesce(k.promo_status, 'non-promo')) AS promo_status, "
+        "e.price AS suggested_price, d.total_gp, d.total_sales, d.total_units, "
+        f"{aur} / nullif(d.primary_comp_price, 0) * 100 AS sugg_primary_bpi, "
+        f"{aur} / nullif(d.secondary_comp_price, 0) * 100 "
+        "AS sugg_secondary_bpi, d.ppu_violation, d.plg_violation, "
+        "d.price_rounding_violation, d.zone_violation "
+        f"FROM ({pricing_effective_price_sql()}) e "
+        f"JOIN {details} d ON d.pricingscenarioscope_id = "
+        "e.pricingscenarioscope_id AND d.zone_id = e.zone_id "
+        f"JOIN {scope} s ON s.id = d.pricingscenarioscope_id "
+        f"JOIN {qn(cm.Article._meta.db_table)} a ON a.id = e.article_id "
+        f"LEFT JOIN {qn(cm.KVIPromoStatus._meta.db_table)} k "
+        "ON k.article_id = a.id "
+        "WHERE EXISTS (SELECT 1 FROM "
+        f"{qn(cm.PricingRecommendedPrice._meta.db_table)} r "
+        "WHERE r.pricingscenarioscope_id = d.pricingscenarioscope_id "
+        "AND r.zone_id = d.zone_id) "
+        f"AND EXISTS (SELECT 1 FROM {qn(cm.PricingCurrentPrice._meta.db_table)} "
+        "p WHERE p.pln_id = a.pln AND p.zone_id = d.zone_id) "
+        f"AND EXISTS (SELECT 1 FROM {qn(cm.PricingCost._meta.db_table)} c "
+        "WHERE c.pln_id = a.pln AND c.zone_id = d.zone_id) "
+        "WINDOW w AS (PARTITION BY d.pricingscenarioscope_id)"
+    )
+    competitor = ", ".join(
+        f"coalesce((SELECT {side}_competitor_name FROM {weighting} "
+        "WHERE opstudy_id = g.opstudy_id AND zone_ref_id = g.zone_id LIMIT 1), "
+        f"(SELECT {side}_competitor_name FROM {weighting} "
+        "WHERE opstudy_id = g.opstudy_id AND zone = 'all' LIMIT 1)) "
+        f"AS {side}_competitor"
+        for side in ("primary", "secondary")
+    )
+    return (
+        "SELECT g.article_id, g.zone_id, g.pln, g.opstudy_id, g.cm_id, "
+        + ", ".join(f"g.{name}" for name in COMPARED_FIELDS)
+        + f", {_violation('primary')}, {_violation('secondary')}, "
+        "g.ppu_violation, g.plg_violation, g.price_rounding_violation, "
+        f"g.zone_violation FROM ({rows}) g "
+        f"CROSS JOIN LATERAL (SELECT {competitor}) c "
+        f"{_targets('primary')} {_targets('secondary')}"
+    )
+
+
+class PricingScenarioComparison:
+    """
+    Compare pricing scenarios at the (article, zone) level against a base
+    scenario.
+
+    Each compared pair is read with one query joining the two scenarios'
+    grids (`grid_sql`) on their (article, zone) keys, selecting only the
+    compared columns; deltas are computed in SQL.
+    """
+
+    def __init__(self, base, *others):
+        self.base_id = getattr(base, "id", base)
+        self.other_ids = [getattr(other, "id", other) for other in others]
+
+    def _pair(self, other_id, overlapping_only):
+        join = "JOIN" if overlapping_only else "FULL JOIN"
+        keys = ("article_id", "zone_id", "pln", "opstudy_id", "cm_id")
+        columns = [f"coalesce(b.{name}, o.{name}) AS {name}" for name in keys]
+        for name in COMPARED_FIELDS:
+            columns += [
+                f"b.{name} AS {name}_base",
+                f"o.{name} AS {name}_other",
+                f"o.{name} - b.{name} AS {name}_delta",
+            ]
+        for name in COMPARED_FLAGS:
+            columns += [f"b.{name} AS {name}_base", f"o.{name} AS {name}_other"]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT {', '.join(columns)} FROM ({grid_sql()}) b "
+                f"{join} ({grid_sql()}) o "
+                "ON o.article_id = b.article_id AND o.zone_id = b.zone_id "
+                "ORDER BY 1, 2",
+                pricing_effective_price_params(self.base_id)
+                + pricing_effective_price_params(other_id),
+            )
+            names = [column[0] for column in cursor.description]
+            rows = cursor.fetchall()
+        return [{"scenario_id": other_id, **dict(zip(names, row))} for row in rows]
+
+    def rows(self, overlapping_only=True):
+        """
+        One dict per compared scenario and (article, zone), with the base and
+        other value and the delta of every compared field and the base and
+        other state of every violation flag. Keys priced in only one of the
+        two scenarios are included unless `overlapping_only` is set, with
+        None on the missing side.
+        """
+        for other_id in self.other_ids:
+            yield from self._pair(other_id, overlapping_only)
+
+    def aggregate(self, level="opstudy"):
+        """
+        Deltas summed per compared scenario and opstudy or CM ("opstudy" or
+        "cm"), over the overlapping (article, zone) keys: total gp, sales and
+        units, the number of changed suggested prices, and the change in the
+        number of violations.
+        """
+        key = f"{level}_id"
+        totals = defaultdict(
+            lambda: {
+                **{f"{name}_delta": 0 for name in AGGREGATED_FIELDS},
+                "price_changes": 0,
+                "violations_delta": 0,
+            }
+        )
+        for row in self.rows():
+            total = totals[(row["scenario_id"], row[key])]
+            for name in AGGREGATED_FIELDS:
+                total[f"{name}_delta"] += row[f"{name}_delta"] or 0
+            if row["suggested_price_base"] != row["suggested_price_other"]:
+                total["price_changes"] += 1
+            total["violations_delta"] += sum(
+                bool(row[f"{name}_other"]) - bool(row[f"{name}_base"])
+                for name in COMPARED_FLAGS
+            )
+        return [
+            {"scenario_id": scenario_id, key: node, **total}
+            for (scenario_id, node), total in sorted(
+                totals.items(), key=lambda item: (item[0][0], str(item[0][1]))
+            )
+        ]
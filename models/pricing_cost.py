@@ -1,11 +1,39 @@
 from bulk_update_or_create import BulkUpdateOrCreateQuerySet
 from django.db import models
+from django.db.models.signals import post_delete, post_save
 
 from core.models import mixins as core_mixins
+from core.models.bulk import defer_on_commit
+from core.models.markdown_scenario import OutdatedScenarioFlag
+
+
+class ScenarioInputQuerySet(BulkUpdateOrCreateQuerySet):
+    """
+    Bulk writes of per-article scenario inputs (costs, current prices) flag
+    the affected markdown scenarios outdated on commit.
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        created = super().bulk_create(objs, *args, **kwargs)
+        defer_on_commit(OutdatedScenarioFlag, [obj.pln_id for obj in objs])
+        return created
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        updated = super().bulk_update(objs, fields, *args, **kwargs)
+        defer_on_commit(OutdatedScenarioFlag, [obj.pln_id for obj in objs])
+        return updated
+
+    def bulk_update_or_create(self, objs, update_fields, *args, **kwargs):
+        objs = list(objs)
+        result = super().bulk_update_or_create(objs, update_fields, *args, **kwargs)
+        defer_on_commit(OutdatedScenarioFlag, [obj.pln_id for obj in objs])
+        return result
 
 
 class PricingCost(core_mixins.TimeStampMixin, models.Model):
-    objects = BulkUpdateOrCreateQuerySet.as_manager()
+    objects = ScenarioInputQuerySet.as_manager()
 
     article_id = models.IntegerField(null=True, blank=True)
     pln = models.ForeignKey(
@@ -31,3 +59,12 @@ class PricingCost(core_mixins.TimeStampMixin, models.Model):
             models.Index(fields=["article_id"]),
             models.Index(fields=["pln"]),
         ]
+
+
+def _flag_outdated_scenarios(sender, instance, **kwargs):
+    defer_on_commit(OutdatedScenarioFlag, [instance.pln_id])
+
+
+for _sender in ("core.PricingCost", "core.PricingCurrentPrice"):
+    post_save.connect(_flag_outdated_scenarios, sender=_sender, weak=False)
+    post_delete.connect(_flag_outdated_scenarios, sender=_sender, weak=False)
@@ -1,10 +1,10 @@
 from decimal import Decimal
 
-from bulk_update_or_create import BulkUpdateOrCreateQuerySet
 from django.core.validators import MinValueValidator
 from django.db import models
 
 from core.models import mixins as core_mixins
+from core.models.pricing_cost import ScenarioInputQuerySet
 
 
 class PricingPrice(core_mixins.TimeStampMixin, models.Model):
@@ -29,7 +29,7 @@ class PricingPrice(core_mixins.TimeStampMixin, models.Model):
 
 
 class PricingCurrentPrice(PricingPrice):
-    objects = BulkUpdateOrCreateQuerySet.as_manager()
+    objects = ScenarioInputQuerySet.as_manager()
 
     article_id = models.IntegerField(null=True, blank=True)
     pln = models.ForeignKey(
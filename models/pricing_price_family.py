@@ -0,0 +1,140 @@
+from django.db import connection, models, transaction
+
+from core import models as cm
+from core.models.bulk import qn
+
+
+class PricingPriceSource(models.TextChoices):
+    CMPLANNED = "CMPLANNED"
+    PLANNED = "PLANNED"
+    RECOMMENDED = "RECOMMENDED"
+
+
+def pricing_effective_price_sql():
+    """
+    SELECT returning the winning price per (scope, zone) of a pricing
+    scenario, with the scope's article. Takes the parameters built by
+    `pricing_effective_price_params`.
+
+    Precedence matches `ScenarioScopeZoneDetails.suggested_price`: CM planned,
+    then planned, then recommended, skipping overrides without a price.
+    """
+    scope = qn(cm.PricingScenarioScope._meta.db_table)
+    prices = {
+        PricingPriceSource.CMPLANNED: qn(cm.PricingCMPlannedPrice._meta.db_table),
+        PricingPriceSource.PLANNED: qn(cm.PricingPlannedPrice._meta.db_table),
+        PricingPriceSource.RECOMMENDED: qn(
+            cm.PricingRecommendedPrice._meta.db_table
+        ),
+    }
+    # Each branch is limited to the scenario's scopes before the UNION.
+    keys = " UNION ".join(
+        f"SELECT pricingscenarioscope_id, zone_id FROM {table} "
+        f"WHERE pricingscenarioscope_id IN "
+        f"(SELECT id FROM {scope} WHERE scenario_id = %s)"
+        for table in prices.values()
+    )
+    joins = " ".join(
+        f"LEFT JOIN {table} {source.lower()} "
+        f"ON {source.lower()}.pricingscenarioscope_id = s.id "
+        f"AND {source.lower()}.zone_id = k.zone_id"
+        for source, table in prices.items()
+    )
+    return (
+        "SELECT s.id AS pricingscenarioscope_id, s.article_id, k.zone_id, "
+        "coalesce(cmplanned.price, planned.price, recommended.price) AS price, "
+        "CASE "
+        + " ".join(
+            f"WHEN {source.lower()}.price IS NOT NULL THEN '{source}'"
+            for source in prices
+        )
+        + f" END AS source FROM {scope} s JOIN ({keys}) k "
+        f"ON k.pricingscenarioscope_id = s.id {joins} WHERE s.scenario_id = %s"
+    )
+
+
+def pricing_effective_price_params(scenario_id):
+    return [scenario_id] * 4
+
+
+class PriceFamilyChecker:
+    """
+    Enforce that articles sharing a price family (SRL) are priced alike in
+    every zone of a pricing scenario.
+
+    Effective prices are resolved in SQL, so both detecting mismatches and
+    propagating the SRL master's price are single statements over the whole
+    scenario instead of a loop over families.
+    """
+
+    def __init__(self, scenario):
+        self.scenario_id = getattr(scenario, "id", scenario)
+
+    def _families(self):
+        return (
+            f"SELECT e.*, a.pln, a.price_family, a.is_master "
+            f"FROM ({pricing_effective_price_sql()}) e "
+            f"JOIN {qn(cm.Article._meta.db_table)} a ON a.id = e.article_id "
+            "WHERE a.price_family IS NOT NULL AND e.price IS NOT NULL"
+        )
+
+    def mismatches(self):
+        """
+        (price family, zone) pairs whose members have different effective
+        prices, with the distinct prices and the member plns.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT f.price_family, f.zone_id, "
+                "array_agg(DISTINCT f.price ORDER BY f.price), "
+                "array_agg(f.pln ORDER BY f.pln), "
+                "min(f.pln) FILTER (WHERE f.is_master) "
+                f"FROM ({self._families()}) f "
+                "GROUP BY f.price_family, f.zone_id "
+                "HAVING count(DISTINCT f.price) > 1 "
+                "ORDER BY f.price_family, f.zone_id",
+                pricing_effective_price_params(self.scenario_id),
+            )
+            columns = ("price_family", "zone_id", "prices", "plns", "master")
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def propagate(self, comments="Aligned with price family master"):
+        """
+        Give every family member the effective price of its family's master in
+        the same zone. Planned prices are upserted, and existing CM planned
+        prices, which would otherwise win, are aligned too. Families without a
+        master in the scope are left alone. Returns the number of rows written.
+        """
+        planned = qn(cm.PricingPlannedPrice._meta.db_table)
+        cm_planned = qn(cm.PricingCMPlannedPrice._meta.db_table)
+        targets = (
+            f"WITH f AS ({self._families()}), "
+            "m AS (SELECT DISTINCT ON (price_family, zone_id) price_family, "
+            "zone_id, price FROM f WHERE is_master "
+            "ORDER BY price_family, zone_id, article_id), "
+            "t AS (SELECT f.pricingscenarioscope_id, f.zone_id, f.pln, m.price "
+            "FROM f JOIN m ON m.price_family = f.price_family "
+            "AND m.zone_id = f.zone_id WHERE f.price <> m.price) "
+        )
+        params = pricing_effective_price_params(self.scenario_id)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                targets + f"UPDATE {cm_planned} c SET price = t.price, "
+                "updated_at = now() FROM t "
+                "WHERE c.pricingscenarioscope_id = t.pricingscenarioscope_id "
+                "AND c.zone_id = t.zone_id AND c.price IS NOT NULL",
+                params,
+            )
+            written = cursor.rowcount
+            cursor.execute(
+                targets + f"INSERT INTO {planned} (pricingscenarioscope_id, "
+                "zone_id, pln, price, zone_differential, comments, created_at, "
+                "updated_at) SELECT pricingscenarioscope_id, zone_id, pln, "
+                "price, false, %s, now(), now() FROM t "
+                "ON CONFLICT (zone_id, pricingscenarioscope_id) DO UPDATE "
+                "SET price = excluded.price, comments = excluded.comments, "
+                f"updated_at = now() WHERE {planned}.price "
+                "IS DISTINCT FROM excluded.price",
+                params + [comments],
+            )
+            return written + cursor.rowcount
@@ -1,9 +1,13 @@
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db import models
+from django.db import connection, models
+from django.db.models.signals import post_save
 from django.utils import timezone
 
+from core import models as cm
 from core.models import managers as core_managers
 from core.models import mixins as core_mixins
+from core.models.bulk import defer_on_commit, qn
+from core.models.dimensions import CanonicalDimensionsMixin, CanonicalDimensionsQuerySet
 from core.utils.ordered_enum import OrderedEnum
 
 
@@ -12,8 +16,37 @@ class PricingScenarioScopeFileInsertType(models.TextChoices):
     REPLACE = "REPLACE"
 
 
+class PriceIndexTargetSeed:
+    """
+    On-commit callback seeding the price index targets of the pricing
+    scenarios whose scope gained articles during the transaction.
+    """
+
+    def __init__(self):
+        self.scenario_ids = set()
+
+    def add(self, scenario_ids):
+        self.scenario_ids.update(scenario_ids)
+
+    def __call__(self):
+        for scenario_id in sorted(self.scenario_ids):
+            PriceIndexTarget.objects.seed(scenario_id)
+
+
+class PricingScenarioScopeQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        Bulk inserts send no post_save, so seed the targets of the touched
+        scenarios on commit here.
+        """
+        objs = list(objs)
+        created = super().bulk_create(objs, *args, **kwargs)
+        defer_on_commit(PriceIndexTargetSeed, {obj.scenario_id for obj in objs})
+        return created
+
+
 class PricingScenarioScope(models.Model):
-    objects = models.Manager()
+    objects = PricingScenarioScopeQuerySet.as_manager()
     annotated = core_managers.PricingScenarioScopeManager()
 
     scenario = models.ForeignKey(
@@ -119,7 +152,84 @@ class PricingScenario(core_mixins.TimeStampMixin, models.Model):
         ordering = ["id"]
 
 
-class PriceIndexTarget(models.Model):
+TARGET_DIMENSIONS = (
+    "zone",
+    "kvi_class",
+    "promo_status",
+    "competitor_type",
+    "primary_secondary",
+)
+
+
+class PriceIndexTargetQuerySet(CanonicalDimensionsQuerySet):
+    def seed(self, scenario):
+        """
+        Derive a pricing scenario's targets from the `KVIIndexTarget` defaults
+        in one INSERT ... SELECT, expanding the "all" opstudy wildcard to every
+        opstudy in the scenario's scope. Opstudy-specific defaults win over
+        "all" ones; indices missing from a default come from the
+        `RoleKVIIndexRange` of the opstudy's `OpStudyRole` category.
+
+        Re-seeding updates only rows whose indices still equal the seeded
+        ones, so targets edited by users are kept. Returns the number of rows
+        written.
+        """
+        table = qn(self.model._meta.db_table)
+        dimensions = ", ".join(TARGET_DIMENSIONS)
+        k_dimensions = ", ".join(f"k.{d}" for d in TARGET_DIMENSIONS)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (scenario_id, opstudy_id, {dimensions}, "
+                "zone_ref_id, index_min, index_max, seeded_index_min, "
+                "seeded_index_max) "
+                f"SELECT DISTINCT ON (o.opstudy_id, {k_dimensions}) %s, "
+                f"o.opstudy_id, {k_dimensions}, k.zone_ref_id, "
+                "coalesce(k.index_min, r.index_from), "
+                "coalesce(k.index_max, r.index_to), "
+                "coalesce(k.index_min, r.index_from), "
+                "coalesce(k.index_max, r.index_to) "
+                "FROM (SELECT DISTINCT a.opstudy_id "
+                f"FROM {qn(PricingScenarioScope._meta.db_table)} s "
+                f"JOIN {qn(cm.Article._meta.db_table)} a ON a.id = s.article_id "
+                "WHERE s.scenario_id = %s) o "
+                f"JOIN {qn(cm.KVIIndexTarget._meta.db_table)} k "
+                "ON k.opstudy_ref_id = o.opstudy_id OR k.opstudy = 'all' "
+                "LEFT JOIN LATERAL (SELECT rr.index_from, rr.index_to "
+                f"FROM {qn(cm.OpStudyRole._meta.db_table)} ro "
+                f"JOIN {qn(cm.RoleKVIIndexRange._meta.db_table)} rr "
+                "ON lower(rr.role_category) = lower(ro.role_category) "
+                "AND lower(rr.kvi_class) = k.kvi_class "
+                "WHERE ro.opstudy_id = o.opstudy_id ORDER BY ro.id LIMIT 1) r "
+                "ON true "
+                f"ORDER BY o.opstudy_id, {k_dimensions}, k.opstudy = 'all' "
+                f"ON CONFLICT (scenario_id, opstudy_id, {dimensions}) DO UPDATE "
+                "SET zone_ref_id = excluded.zone_ref_id, "
+                "index_min = excluded.index_min, index_max = excluded.index_max, "
+                "seeded_index_min = excluded.seeded_index_min, "
+                "seeded_index_max = excluded.seeded_index_max "
+                f"WHERE {table}.index_min IS NOT DISTINCT FROM "
+                f"{table}.seeded_index_min "
+                f"AND {table}.index_max IS NOT DISTINCT FROM "
+                f"{table}.seeded_index_max "
+                f"AND ({table}.index_min, {table}.index_max) IS DISTINCT FROM "
+                "(excluded.index_min, excluded.index_max)",
+                [getattr(scenario, "id", scenario)] * 2,
+            )
+            return cursor.rowcount
+
+
+class PriceIndexTarget(CanonicalDimensionsMixin, models.Model):
+    objects = PriceIndexTargetQuerySet.as_manager()
+
+    canonical_dimensions = (
+        "primary_secondary",
+        "promo_status",
+        "zone",
+        "competitor_type",
+        "kvi_class",
+    )
+    dimension_refs = {"zone": "Zone"}
+
     scenario = models.ForeignKey(
         "core.PricingScenario",
         on_delete=models.CASCADE,
@@ -139,16 +249,42 @@ class PriceIndexTarget(models.Model):
     actual_index = models.IntegerField(null=True, blank=True)
     index_min = models.IntegerField(null=True)
     index_max = models.IntegerField(null=True)
+    # Indices as last seeded from the defaults; rows whose indices differ
+    # were edited by users and are left alone by re-seeding.
+    seeded_index_min = models.IntegerField(null=True, blank=True)
+    seeded_index_max = models.IntegerField(null=True, blank=True)
+
+    # Typed `zone`, NULL for `all`; set on save.
+    zone_ref = models.ForeignKey(
+        "core.Zone",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
 
     class Meta:
         unique_together = (
             "scenario",
             "opstudy",
+            "zone",
             "primary_secondary",
             "promo_status",
             "competitor_type",
             "kvi_class",
         )
+        indexes = [
+            models.Index(
+                fields=[
+                    "scenario",
+                    "opstudy",
+                    "zone_ref",
+                    "kvi_class",
+                    "promo_status",
+                    "primary_secondary",
+                ]
+            ),
+        ]
 
 
 class ScenarioScopeZoneDetails(core_mixins.TimeStampMixin, models.Model):
@@ -238,3 +374,14 @@ class ScenarioScopeZoneDetails(core_mixins.TimeStampMixin, models.Model):
     class Meta:
         unique_together = ("pricingscenarioscope", "zone")
         ordering = ["zone"]
+
+
+def _seed_price_index_targets(sender, instance, created, **kwargs):
+    # New opstudies may need targets; edited targets are kept.
+    if created:
+        defer_on_commit(PriceIndexTargetSeed, [instance.scenario_id])
+
+
+post_save.connect(
+    _seed_price_index_targets, sender="core.PricingScenarioScope", weak=False
+)
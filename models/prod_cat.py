@@ -1,10 +1,10 @@
 from bulk_update_or_create import BulkUpdateOrCreateQuerySet
 from django.db import models
 
-from core.models.mixins import TimeStampMixin
+from core.models.mixins import ContentHashMixin, TimeStampMixin
 
 
-class ProductCategory(TimeStampMixin, models.Model):
+class ProductCategory(ContentHashMixin, TimeStampMixin, models.Model):
     objects = BulkUpdateOrCreateQuerySet.as_manager()
 
     prod_cat_id = models.IntegerField(unique=True)
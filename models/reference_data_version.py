@@ -0,0 +1,78 @@
+from django.db import models
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+
+from core.models.bulk import defer_on_commit
+
+
+class ReferenceDataVersionManager(models.Manager):
+    def current(self, *names):
+        """
+        Current version of each named reference data set; sets never bumped
+        are at version 0.
+        """
+        versions = dict(self.filter(name__in=names).values_list("name", "version"))
+        return {name: versions.get(name, 0) for name in names}
+
+    def bump(self, *names):
+        """
+        Invalidate everything derived from the named reference data sets.
+        """
+        for name in names:
+            if not self.filter(name=name).update(version=F("version") + 1):
+                self.get_or_create(name=name, defaults={"version": 1})
+
+
+class ReferenceDataVersion(models.Model):
+    """
+    Version counter per reference data set (e.g. "article", "zone"), bumped
+    whenever the set changes. Caches key their entries on these versions so
+    they are invalidated across processes without coordination.
+    """
+
+    objects = ReferenceDataVersionManager()
+
+    name = models.CharField(max_length=50, unique=True)
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}@{self.version}"
+
+
+REFERENCE_DATA_SENDERS = {
+    "core.Article": "article",
+    "core.Zone": "zone",
+    "core.StoreZone": "zone",
+    "core.GMM": "hierarchy",
+    "core.DMM": "hierarchy",
+    "core.CM": "hierarchy",
+    "core.MerchDivision": "hierarchy",
+    "core.OpStudy": "hierarchy",
+    "core.ProductCategory": "hierarchy",
+    "core.NBOBRole": "hierarchy",
+}
+
+
+class ReferenceDataBump:
+    """
+    On-commit callback bumping each reference data set changed during the
+    transaction once, however many of its rows were written.
+    """
+
+    def __init__(self):
+        self.names = set()
+
+    def add(self, names):
+        self.names.update(names)
+
+    def __call__(self):
+        ReferenceDataVersion.objects.bump(*sorted(self.names))
+
+
+def _bump_reference_data(sender, **kwargs):
+    defer_on_commit(ReferenceDataBump, [REFERENCE_DATA_SENDERS[sender._meta.label]])
+
+
+for _sender in REFERENCE_DATA_SENDERS:
+    post_save.connect(_bump_reference_data, sender=_sender, weak=False)
+    post_delete.connect(_bump_reference_data, sender=_sender, weak=False)
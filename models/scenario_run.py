@@ -0,0 +1,243 @@
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from core import models as cm
+from core.models import mixins as core_mixins
+
+
+class ScenarioRunType(models.TextChoices):
+    MARKDOWN = "MARKDOWN"
+    PRICING = "PRICING"
+
+
+class ScenarioRunStatus(models.TextChoices):
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    DONE = "DONE"
+    FAILED = "FAILED"
+    TIMEOUT = "TIMEOUT"
+
+
+ACTIVE_STATUSES = [ScenarioRunStatus.PENDING, ScenarioRunStatus.RUNNING]
+
+
+class ScenarioRunManager(models.Manager):
+    def submit(self, scenario, priority=0):
+        """
+        Queue a run for a markdown or pricing scenario. Submitting a scenario
+        that already has a pending or running job returns that job instead of
+        queueing a duplicate.
+        """
+        if isinstance(scenario, cm.MarkdownScenario):
+            fields = {
+                "type": ScenarioRunType.MARKDOWN,
+                "markdown_scenario": scenario,
+                "event_id": scenario.event_id,
+            }
+            key = {"markdown_scenario": scenario}
+        else:
+            fields = {"type": ScenarioRunType.PRICING, "pricing_scenario": scenario}
+            key = {"pricing_scenario": scenario}
+
+        active = self.filter(status__in=ACTIVE_STATUSES, **key)
+        run = active.first()
+        if run is not None:
+            return run
+        try:
+            with transaction.atomic():
+                run = self.create(priority=priority, **fields)
+                self._set_scenario_status(run, ScenarioRunStatus.PENDING)
+        except IntegrityError:
+            # Lost a race against a concurrent submission of the same scenario.
+            return active.get()
+        return run
+
+    def claim(self, worker, limit, event_concurrency=None):
+        """
+        Atomically move up to `limit` pending jobs to RUNNING for `worker`,
+        highest priority first. Rows locked by other workers are skipped, and
+        no markdown event gets more than `event_concurrency` running jobs.
+
+        An event's running jobs are counted while its row is locked, so two
+        workers cannot both take its last free slot; events locked by another
+        worker are skipped until the next claim. Events without a free slot
+        are left out of further candidates, so their backlog cannot crowd out
+        the jobs of other events.
+        """
+        if limit <= 0:
+            return []
+        throttled = event_concurrency is not None
+        with transaction.atomic():
+            claimed, running, blocked = [], {}, set()
+            while len(claimed) < limit:
+                candidates = list(
+                    self.select_for_update(skip_locked=True)
+                    .filter(status=ScenarioRunStatus.PENDING)
+                    .exclude(id__in=[run.id for run in claimed])
+                    .exclude(event_id__in=blocked)
+                    .order_by("-priority", "created_at")[: limit * 4]
+                )
+                if not candidates:
+                    break
+                if throttled:
+                    self._lock_events(candidates, running, blocked, event_concurrency)
+                for run in candidates:
+                    if run.event_id in blocked:
+                        continue
+                    if throttled and run.event_id is not None:
+                        running[run.event_id] += 1
+                        if running[run.event_id] >= event_concurrency:
+                            blocked.add(run.event_id)
+                    claimed.append(run)
+                    if len(claimed) == limit:
+                        break
+
+            now = timezone.now()
+            for run in claimed:
+                run.status = ScenarioRunStatus.RUNNING
+                run.worker = worker
+                run.started_at = now
+                run.heartbeat_at = now
+                run.attempts += 1
+                self._set_scenario_status(run, ScenarioRunStatus.RUNNING)
+            self.bulk_update(
+                claimed,
+                ["status", "worker", "started_at", "heartbeat_at", "attempts"],
+            )
+        return claimed
+
+    def _lock_events(self, candidates, running, blocked, event_concurrency):
+        """
+        Lock the events of `candidates` not seen yet and count their running
+        jobs into `running`. Events locked elsewhere or without a free slot
+        are added to `blocked`.
+        """
+        events = {run.event_id for run in candidates} - {None} - set(running)
+        events -= blocked
+        if not events:
+            return
+        locked = set(
+            cm.MarkdownEvent.objects.select_for_update(skip_locked=True, no_key=True)
+            .filter(id__in=events)
+            .values_list("id", flat=True)
+        )
+        running.update(dict.fromkeys(locked, 0))
+        running.update(
+            self.filter(status=ScenarioRunStatus.RUNNING, event_id__in=locked)
+            .values_list("event_id")
+            .annotate(n=Count("id"))
+            .order_by()
+        )
+        blocked.update(events - locked)
+        blocked.update(e for e in locked if running[e] >= event_concurrency)
+
+    def heartbeat(self, run_ids):
+        return self.filter(
+            id__in=list(run_ids), status=ScenarioRunStatus.RUNNING
+        ).update(heartbeat_at=timezone.now())
+
+    def finish(self, run, status, error=""):
+        with transaction.atomic():
+            updated = self.filter(id=run.id, status=ScenarioRunStatus.RUNNING).update(
+                status=status, error=error, finished_at=timezone.now()
+            )
+            # A run reaped as TIMEOUT keeps that status.
+            if updated:
+                run.status = status
+                self._set_scenario_status(run, status)
+        return bool(updated)
+
+    def reap(self, timeout):
+        """
+        Mark RUNNING jobs whose last heartbeat is older than `timeout` (a
+        timedelta) as TIMEOUT, along with their scenarios.
+        """
+        with transaction.atomic():
+            stale = list(
+                self.select_for_update(skip_locked=True).filter(
+                    status=ScenarioRunStatus.RUNNING,
+                    heartbeat_at__lt=timezone.now() - timeout,
+                )
+            )
+            for run in stale:
+                run.status = ScenarioRunStatus.TIMEOUT
+                run.finished_at = timezone.now()
+                self._set_scenario_status(run, ScenarioRunStatus.TIMEOUT)
+            self.bulk_update(stale, ["status", "finished_at"])
+        return stale
+
+    @staticmethod
+    def _set_scenario_status(run, status):
+        if run.type == ScenarioRunType.MARKDOWN:
+            cm.MarkdownScenario.objects.filter(id=run.markdown_scenario_id).update(
+                status=status
+            )
+        else:
+            cm.PricingScenario.objects.filter(id=run.pricing_scenario_id).update(
+                status=status
+            )
+
+
+class ScenarioRun(core_mixins.TimeStampMixin, models.Model):
+    """Hold queued and past optimizer runs of markdown and pricing scenarios"""
+
+    objects = ScenarioRunManager()
+
+    type = models.CharField(max_length=20, choices=ScenarioRunType.choices)
+    markdown_scenario = models.ForeignKey(
+        "core.MarkdownScenario",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="runs",
+    )
+    pricing_scenario = models.ForeignKey(
+        "core.PricingScenario",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="runs",
+    )
+    # Markdown runs are throttled per event.
+    event = models.ForeignKey(
+        "core.MarkdownEvent",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="runs",
+    )
+    priority = models.IntegerField(default=0)
+    status = models.CharField(
+        max_length=20,
+        choices=ScenarioRunStatus.choices,
+        default=ScenarioRunStatus.PENDING,
+    )
+    worker = models.CharField(max_length=100, blank=True)
+    attempts = models.IntegerField(default=0)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True, default="")
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(
+                fields=["-priority", "created_at"],
+                name="scenario_run_pending_idx",
+                condition=Q(status=ScenarioRunStatus.PENDING),
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["markdown_scenario"],
+                condition=Q(status__in=ACTIVE_STATUSES),
+                name="scenario_run_active_markdown",
+            ),
+            models.UniqueConstraint(
+                fields=["pricing_scenario"],
+                condition=Q(status__in=ACTIVE_STATUSES),
+                name="scenario_run_active_pricing",
+            ),
+        ]
@@ -0,0 +1,126 @@
+import logging
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.db import close_old_connections
+
+from core.models.scenario_run import ScenarioRun, ScenarioRunStatus
+
+logger = logging.getLogger(__name__)
+
+
+class ScenarioRunner:
+    """
+    Executes one claimed `ScenarioRun`. Subclasses call the optimizer and
+    raise to mark the run FAILED.
+    """
+
+    def run(self, scenario_run):
+        raise NotImplementedError
+
+
+class FakeOptimizerRunner(ScenarioRunner):
+    """
+    Local stand-in for the optimizer, for tests and development. Sleeps for
+    `duration` seconds, then fails if `fail` is set, otherwise calls
+    `on_run(scenario_run)` when given.
+    """
+
+    def __init__(self, duration=0, fail=False, on_run=None):
+        self.duration = duration
+        self.fail = fail
+        self.on_run = on_run
+        self.runs = []
+
+    def run(self, scenario_run):
+        self.runs.append(scenario_run.id)
+        time.sleep(self.duration)
+        if self.fail:
+            raise RuntimeError("Fake optimizer failure")
+        if self.on_run is not None:
+            self.on_run(scenario_run)
+
+
+class ScenarioScheduler:
+    """
+    Run queued scenario jobs on a local thread pool.
+
+    Each `run_once` call times out jobs whose heartbeat is older than
+    `timeout`, heartbeats the jobs running in this process, and claims as many
+    pending jobs as there are free workers. Because claiming uses
+    SKIP LOCKED, several schedulers can share the same queue.
+    """
+
+    def __init__(
+        self,
+        runner,
+        workers=4,
+        event_concurrency=None,
+        timeout=timedelta(minutes=30),
+        poll_interval=5,
+        name=None,
+    ):
+        self.runner = runner
+        self.workers = workers
+        self.event_concurrency = event_concurrency
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.name = name or f"{socket.gethostname()}:{id(self)}"
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.in_flight = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def run_once(self):
+        ScenarioRun.objects.reap(self.timeout)
+        with self.lock:
+            ScenarioRun.objects.heartbeat(self.in_flight)
+            free = self.workers - len(self.in_flight)
+        for scenario_run in ScenarioRun.objects.claim(
+            self.name, free, self.event_concurrency
+        ):
+            with self.lock:
+                self.in_flight[scenario_run.id] = self.executor.submit(
+                    self._execute, scenario_run
+                )
+
+    def run_forever(self):
+        while not self.stopped.is_set():
+            self.run_once()
+            self.stopped.wait(self.poll_interval)
+        self.executor.shutdown(wait=True)
+
+    def stop(self):
+        self.stopped.set()
+
+    def drain(self):
+        """
+        Run until the queue is empty and every in-flight job finished.
+        Mostly useful in tests together with `FakeOptimizerRunner`.
+        """
+        while True:
+            self.run_once()
+            with self.lock:
+                busy = bool(self.in_flight)
+            if not busy and not ScenarioRun.objects.filter(
+                status=ScenarioRunStatus.PENDING
+            ).exists():
+                return
+            time.sleep(0.05)
+
+    def _execute(self, scenario_run):
+        close_old_connections()
+        try:
+            self.runner.run(scenario_run)
+        except Exception as e:
+            logger.exception("Scenario run %s failed", scenario_run.id)
+            ScenarioRun.objects.finish(scenario_run, ScenarioRunStatus.FAILED, str(e))
+        else:
+            ScenarioRun.objects.finish(scenario_run, ScenarioRunStatus.DONE)
+        finally:
+            with self.lock:
+                self.in_flight.pop(scenario_run.id, None)
+            close_old_connections()
@@ -0,0 +1,332 @@
+import csv
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from core import models as cm
+from core.models.merch_hierarchy_cache import merch_hierarchy
+
+TRUE_VALUES = {"1", "true", "t", "yes", "y"}
+FALSE_VALUES = {"0", "false", "f", "no", "n"}
+
+
+def _boolean(value, row, indexes):
+    value = value.strip().lower()
+    if not value:
+        return None
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValueError("expected a boolean")
+
+
+def _decimal(value, row, indexes):
+    if not value.strip():
+        return None
+    try:
+        return str(Decimal(value.strip()).quantize(Decimal("0.01")))
+    except InvalidOperation:
+        raise ValueError("expected a number")
+
+
+def _integer(value, row, indexes):
+    return int(value) if value.strip() else None
+
+
+def _date(value, row, indexes):
+    return date.fromisoformat(value.strip()).isoformat() if value.strip() else None
+
+
+def _fraction(value, row, indexes):
+    if not value.strip():
+        return None
+    number = float(value)
+    if not 0 <= number <= 1:
+        raise ValueError("must be between 0 and 1")
+    return number
+
+
+def _article(value, row, indexes):
+    if not value.strip():
+        return None
+    try:
+        return indexes["pln"][value.strip()]
+    except KeyError:
+        raise ValueError(f"unknown pln {value.strip()}")
+
+
+def _store(value, row, indexes):
+    store = _integer(value, row, indexes)
+    if store is not None and store not in indexes["store"]:
+        raise ValueError(f"unknown store {store}")
+    return store
+
+
+def _zone(value, row, indexes):
+    zone = _integer(value, row, indexes)
+    if zone is not None and zone not in indexes["zone"]:
+        raise ValueError(f"unknown zone {zone}")
+    return zone
+
+
+# file column -> (parsed column, parser, required)
+SCOPE_FILE_COLUMNS = {
+    cm.UploadedFileCategory.MARKDOWNEVENTSCOPE: {
+        "pln": ("article_id", _article, True),
+        "store": ("store", _store, False),
+        "call_in": ("call_in", _boolean, False),
+        "item_md_end_date": ("item_md_end_date", _date, False),
+        "clone_pln": ("clone_article_id", _article, False),
+        "cost_overwrite": ("cost_overwrite", _decimal, False),
+        "vendor_funding": ("vendor_funding", _decimal, False),
+        "discount_covered": ("discount_covered", _fraction, False),
+        "online_market": ("online_market", _boolean, False),
+        "discount_group": ("discount_group", _integer, False),
+    },
+    cm.UploadedFileCategory.PRICINGSCENARIOSCOPE: {
+        "pln": ("article_id", _article, True),
+        "zone": ("zone", _zone, False),
+        "vendor_funding": ("vendor_funding", _decimal, False),
+        "dept_cost_override": ("dept_cost_override", _decimal, False),
+        "dept_cost_override_date": ("dept_cost_override_date", _date, False),
+    },
+}
+
+# Parsed columns identifying a line; repeated keys are reported as errors.
+# Lines of the same article (the first key column) must agree on every other
+# column but the key, since they become a single scope row.
+SCOPE_FILE_KEYS = {
+    cm.UploadedFileCategory.MARKDOWNEVENTSCOPE: ("article_id", "store"),
+    cm.UploadedFileCategory.PRICINGSCENARIOSCOPE: ("article_id",),
+}
+
+
+@dataclass
+class ParsedScopeFile:
+    """Columnar, validated content of a scope upload file"""
+
+    file_category: str
+    columns: dict = field(default_factory=dict)
+    row_count: int = 0
+    error_count: int = 0
+    errors: list = field(default_factory=list)
+
+    @property
+    def is_valid(self):
+        return self.error_count == 0
+
+    def rows(self):
+        names = list(self.columns)
+        return (dict(zip(names, values)) for values in zip(*self.columns.values()))
+
+
+def load_reference_indexes():
+    """
+    In-memory reference data every validation chunk is checked against.
+    """
+    return {
+        "pln": dict(cm.Article.objects.values_list("pln", "id")),
+        "store": set(cm.StoreZone.objects.values_list("store_id", flat=True)),
+        "zone": set(merch_hierarchy.get().zones_by_code),
+    }
+
+
+_worker_indexes = None
+
+
+def _init_worker(indexes):
+    global _worker_indexes
+    _worker_indexes = indexes
+
+
+def validate_chunk(
+    file_category, header, first_line, lines, max_errors, indexes=None
+):
+    """
+    Parse and validate a chunk of CSV lines. Returns the parsed columns of the
+    valid lines, the number of rejected lines with up to `max_errors` of their
+    messages, and the (line, key, other values) of the valid lines for
+    duplicate and consistency checks across chunks.
+    """
+    indexes = indexes if indexes is not None else _worker_indexes
+    spec = SCOPE_FILE_COLUMNS[file_category]
+    key_columns = SCOPE_FILE_KEYS[file_category]
+    used = [(i, name, *spec[name]) for i, name in enumerate(header) if name in spec]
+    columns = {target: [] for _, _, target, _, _ in used}
+    keys, errors, error_count = [], [], 0
+
+    reader, read = csv.reader(lines), 0
+    for row in reader:
+        # Quoted values may span lines; report the record's first line.
+        line, read = first_line + read, reader.line_num
+        parsed, problems = {}, []
+        for i, name, target, parser, required in used:
+            value = row[i] if i < len(row) else ""
+            if required and not value.strip():
+                problems.append(f"{name} is required")
+                continue
+            try:
+                parsed[target] = parser(value, row, indexes)
+            except ValueError as e:
+                problems.append(f"{name}: {e}")
+        if problems:
+            error_count += 1
+            if len(errors) < max_errors:
+                errors.append({"line": line, "message": "; ".join(problems)})
+            continue
+        for target, values in columns.items():
+            values.append(parsed[target])
+        keys.append(
+            (
+                line,
+                tuple(parsed.get(k) for k in key_columns),
+                tuple(v for k, v in parsed.items() if k not in key_columns),
+            )
+        )
+
+    return columns, error_count, errors, keys
+
+
+class ScopeFileValidator:
+    """
+    Validate a scope upload in chunks on a process pool.
+
+    Reference data (Article pln, StoreZone stores, Zone codes) is loaded once
+    and handed to the workers. Chunk results are merged in file order, and
+    progress plus a capped sample of errors is written to
+    `FileUploadTask.validation` as each chunk completes.
+    """
+
+    def __init__(self, task, workers=None, chunk_lines=50000, max_errors=100):
+        self.task = task
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_lines = chunk_lines
+        self.max_errors = max_errors
+
+    def _publish(self, parsed, status):
+        cm.FileUploadTask.objects.filter(pk=self.task.pk).update(
+            validation={
+                "status": status,
+                "rows": parsed.row_count + parsed.error_count,
+                "valid_rows": parsed.row_count,
+                "error_count": parsed.error_count,
+                "errors": parsed.errors,
+            }
+        )
+
+    def _chunks(self, stream):
+        """
+        Groups of about `chunk_lines` lines, only cut between records so that
+        quoted values spanning several lines stay within one chunk.
+        """
+        first_line, lines, quoted = 2, [], False
+        for line in stream:
+            lines.append(line)
+            # Escaped quotes come in pairs and leave the state unchanged.
+            quoted ^= line.count('"') % 2 == 1
+            if len(lines) >= self.chunk_lines and not quoted:
+                yield first_line, lines
+                first_line += len(lines)
+                lines = []
+        if lines:
+            yield first_line, lines
+
+    def run(self, indexes=None, use_cache=True):
+        """
+        Validate the task's payload. Payloads already validated against the
+        current reference data are served from `ParsedUploadCache`.
+        """
+        category = self.task.file_category
+        spec = SCOPE_FILE_COLUMNS[category]
+        content_hash = self.task.content_hash if use_cache else ""
+        if content_hash:
+            cached = cm.ParsedUploadCache.objects.fetch(content_hash, category)
+            if cached is not None:
+                self._publish(cached, "DONE")
+                return cached
+
+        parsed = ParsedScopeFile(file_category=category)
+        indexes = indexes if indexes is not None else load_reference_indexes()
+
+        with self.task.open_content() as raw:
+            stream = io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+            header = [name.strip().lower() for name in next(csv.reader(stream), [])]
+            missing = [n for n, (_, _, required) in spec.items() if required]
+            missing = [n for n in missing if n not in header]
+            if missing:
+                parsed.error_count = 1
+                parsed.errors = [
+                    {"line": 1, "message": f"missing columns: {', '.join(missing)}"}
+                ]
+                self._publish(parsed, "DONE")
+                return parsed
+            parsed.columns = {spec[name][0]: [] for name in header if name in spec}
+
+            seen, shared = set(), {}
+            context = multiprocessing.get_context("fork")
+            with ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(indexes,),
+            ) as pool:
+                pending = []
+                for first_line, lines in self._chunks(stream):
+                    pending.append(
+                        (
+                            first_line,
+                            pool.submit(
+                                validate_chunk,
+                                category,
+                                header,
+                                first_line,
+                                lines,
+                                self.max_errors,
+                            ),
+                        )
+                    )
+                    # Bound the number of chunks held in memory.
+                    if len(pending) >= self.workers * 2:
+                        self._merge(parsed, seen, shared, *pending.pop(0))
+                for chunk in pending:
+                    self._merge(parsed, seen, shared, *chunk)
+
+        parsed.errors.sort(key=lambda error: error["line"])
+        self._publish(parsed, "DONE")
+        if content_hash:
+            cm.ParsedUploadCache.objects.store(content_hash, parsed)
+        return parsed
+
+    def _merge(self, parsed, seen, shared, first_line, future):
+        columns, error_count, errors, keys = future.result()
+        rejected = []
+        for offset, (line, key, others) in enumerate(keys):
+            if key in seen:
+                rejected.append((offset, f"duplicated key {key}"))
+            elif shared.setdefault(key[0], others) != others:
+                rejected.append((offset, f"conflicting values for {key[0]}"))
+            else:
+                seen.add(key)
+        if rejected:
+            drop = {offset for offset, _ in rejected}
+            columns = {
+                name: [v for i, v in enumerate(values) if i not in drop]
+                for name, values in columns.items()
+            }
+            error_count += len(rejected)
+            errors = errors + [
+                {"line": keys[offset][0], "message": message}
+                for offset, message in rejected
+            ]
+
+        for name, values in columns.items():
+            parsed.columns[name].extend(values)
+        parsed.row_count += len(keys) - len(rejected)
+        parsed.error_count += error_count
+        parsed.errors.extend(errors[: max(0, self.max_errors - len(parsed.errors))])
+        self._publish(parsed, "RUNNING")
@@ -0,0 +1,188 @@
+import json
+
+from django.db import connection, transaction
+
+from core import models as cm
+from core.models.bulk import copy_rows, create_staging_table, defer_on_commit, qn
+from core.models.pricing_scenario import PriceIndexTargetSeed
+
+STAGING_TABLE = "scope_upload_staging"
+
+# Values used on insert when a boolean column is missing or empty in the file.
+INSERT_DEFAULTS = {"call_in": "false", "online_market": "true"}
+
+
+class ScopeUploadApplier:
+    """
+    Apply a validated `ParsedScopeFile` to a markdown event or pricing
+    scenario scope by diffing it against the existing rows.
+
+    Only rows whose values change are updated, only new articles are
+    inserted, and for REPLACE only articles missing from the file are
+    deleted, so re-applying the same file writes nothing. Existing rows keep
+    their ids, so planned prices, zone details and other user overrides
+    hanging off unchanged scope rows survive. Columns absent from the file
+    are left untouched on existing rows.
+
+    Uploaded lines carry no article group: they describe an article's
+    ungrouped markdown scope row, and rows assigned to an article group keep
+    their own values.
+    """
+
+    def __init__(self, task, parsed, insert_type):
+        self.task = task
+        self.parsed = parsed
+        self.replace = insert_type == "REPLACE"
+        if parsed.file_category == cm.UploadedFileCategory.MARKDOWNEVENTSCOPE:
+            self.model = cm.MarkdownEventScope
+            self.parent_column = "event_id"
+            self.parent_id = task.markdown_event_id
+        else:
+            self.model = cm.PricingScenarioScope
+            self.parent_column = "scenario_id"
+            self.parent_id = task.pricing_scenario_id
+
+    def staged_rows(self):
+        """
+        One row per article. Markdown files list one store per line, which are
+        collected into the scope's `stores` list. Validation rejects lines
+        that disagree on any other value, so a parsed file that still does is
+        refused rather than silently reduced to its first line.
+        """
+        model_columns = {f.column for f in self.model._meta.local_fields}
+        columns = [c for c in self.parsed.columns if c in model_columns]
+        collect_stores = "store" in self.parsed.columns
+
+        rows, stores = {}, {}
+        for row in self.parsed.rows():
+            article = row["article_id"]
+            first = rows.setdefault(article, row)
+            if any(first[c] != row[c] for c in row if c != "store"):
+                raise ValueError(f"conflicting scope lines for article {article}")
+            if collect_stores and row["store"] is not None:
+                stores.setdefault(article, set()).add(row["store"])
+
+        if collect_stores:
+            columns.append("stores")
+            for article, row in rows.items():
+                row["stores"] = json.dumps(sorted(stores.get(article, ())))
+        return columns, [[row[c] for c in columns] for row in rows.values()]
+
+    def apply(self):
+        columns, rows = self.staged_rows()
+        table = qn(self.model._meta.db_table)
+        parent = self.parent_column
+        values = [c for c in columns if c != "article_id"]
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            create_staging_table(
+                cursor, STAGING_TABLE, self.model._meta.db_table, columns
+            )
+            copy_rows(cursor, STAGING_TABLE, columns, rows)
+            cursor.execute(f"ANALYZE {qn(STAGING_TABLE)}")
+
+            updated = 0
+            if values and self.model is cm.MarkdownEventScope:
+                cursor.execute(
+                    f"UPDATE {table} t SET "
+                    + ", ".join(f"{c} = {self._kept(c)}" for c in values)
+                    + f" FROM {qn(STAGING_TABLE)} s "
+                    f"WHERE t.{parent} = %s AND t.article_id = s.article_id "
+                    "AND t.article_group_id IS NULL "
+                    f"AND ({', '.join('t.' + c for c in values)}) IS DISTINCT FROM "
+                    f"({', '.join(self._kept(c) for c in values)})",
+                    [self.parent_id],
+                )
+                updated = cursor.rowcount
+
+            inserted, upserted = self._insert(cursor, table, columns)
+            updated += upserted
+
+            deleted = 0
+            if self.replace:
+                cursor.execute(
+                    f"SELECT id FROM {table} t WHERE t.{parent} = %s "
+                    f"AND NOT EXISTS (SELECT 1 FROM {qn(STAGING_TABLE)} s "
+                    "WHERE s.article_id = t.article_id)",
+                    [self.parent_id],
+                )
+                stale = [pk for (pk,) in cursor.fetchall()]
+                # Through the ORM so dependent prices and details cascade.
+                if stale:
+                    self.model.objects.filter(id__in=stale).delete()
+                deleted = len(stale)
+
+            changed = inserted or updated or deleted
+            if self.model is cm.MarkdownEventScope and changed:
+                cm.MarkdownScenario.objects.flag_outdated(event_ids=[self.parent_id])
+            elif inserted:
+                # Raw inserts send no post_save.
+                defer_on_commit(PriceIndexTargetSeed, [self.parent_id])
+
+        return {"inserted": inserted, "updated": updated, "deleted": deleted}
+
+    @staticmethod
+    def _kept(column):
+        """
+        Updated value of `column`: empty cells of the non-nullable booleans
+        keep the stored value instead of falling back to the insert default.
+        """
+        if column in INSERT_DEFAULTS:
+            return f"coalesce(s.{column}, t.{column})"
+        return f"s.{column}"
+
+    @staticmethod
+    def _value(column, alias="s"):
+        if column in INSERT_DEFAULTS:
+            return f"coalesce({alias}.{column}, {INSERT_DEFAULTS[column]})"
+        return f"{alias}.{column}"
+
+    def _insert(self, cursor, table, columns):
+        """
+        Insert articles that have no scope row yet. Returns the number of
+        inserted and of updated rows; pricing scopes are upserted, so both
+        happen in the same statement.
+        """
+        parent = self.parent_column
+        missing = [c for c in INSERT_DEFAULTS if c not in columns]
+        if self.model is not cm.MarkdownEventScope:
+            missing = []
+        elif "stores" not in columns:
+            missing.append("stores")
+        target = columns + missing + [parent]
+        selected = (
+            [self._value(c) for c in columns]
+            + [INSERT_DEFAULTS.get(c, "'[]'::jsonb") for c in missing]
+            + ["%s"]
+        )
+        insert = (
+            f"INSERT INTO {table} ({', '.join(target)}) "
+            f"SELECT {', '.join(selected)} FROM {qn(STAGING_TABLE)} s"
+        )
+
+        if self.model is cm.PricingScenarioScope:
+            # (scenario, article) is a plain unique key: upsert idempotently.
+            values = [c for c in columns if c != "article_id"]
+            conflict = " ON CONFLICT (scenario_id, article_id) DO NOTHING"
+            if values:
+                conflict = (
+                    " ON CONFLICT (scenario_id, article_id) DO UPDATE SET "
+                    + ", ".join(f"{c} = excluded.{c}" for c in values)
+                    + f" WHERE ({', '.join(f'{table}.{c}' for c in values)}) "
+                    f"IS DISTINCT FROM ({', '.join('excluded.' + c for c in values)})"
+                )
+            # xmax is 0 only for freshly inserted tuples.
+            cursor.execute(insert + conflict + " RETURNING xmax = 0", [self.parent_id])
+            results = [fresh for (fresh,) in cursor.fetchall()]
+            return sum(results), len(results) - sum(results)
+
+        # The markdown key includes the nullable article_group, which ON
+        # CONFLICT cannot match, so insert only articles without an ungrouped
+        # row; rows of article groups do not count.
+        cursor.execute(
+            insert + f" WHERE NOT EXISTS (SELECT 1 FROM {table} t "
+            "WHERE t.event_id = %s AND t.article_id = s.article_id "
+            "AND t.article_group_id IS NULL)",
+            [self.parent_id, self.parent_id],
+        )
+        return cursor.rowcount, 0
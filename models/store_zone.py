@@ -1,7 +1,214 @@
-from django.db import models
+import threading
+import time
+
+from django.db import connection, models, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from core import models as cm
+from core.models.bulk import copy_rows, create_staging_table, qn
+from core.models.merch_hierarchy_cache import merch_hierarchy
+from core.models.reference_data_version import ReferenceDataVersion
+
+STAGING_TABLE = "store_zone_staging"
+
+
+def zone_for(value):
+    """
+    Zone named by a `StoreZone.zone` string, either its code or description.
+    """
+    value = str(value).strip() if value is not None else ""
+    snapshot = merch_hierarchy.get()
+    if value.isdigit():
+        return snapshot.zones_by_code.get(int(value))
+    return snapshot.zones_by_description.get(value)
+
+
+class StoreZoneQuerySet(models.QuerySet):
+    def resolve(self, store_ids):
+        """
+        Zone id of each store id, None for unknown stores, from the
+        in-memory `store_zones` index.
+        """
+        lookup = store_zones.get().zones
+        return [lookup.get(store_id) for store_id in store_ids]
+
+    def link_zones(self):
+        """
+        Backfill `zone_ref` from the `zone` strings in one UPDATE, then
+        recount the zones whose stores changed.
+        """
+        table = qn(self.model._meta.db_table)
+        zones = qn(cm.Zone._meta.db_table)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} s SET zone_ref_id = z.id FROM {zones} z "
+                "WHERE (z.zone_code::text = trim(s.zone) "
+                "OR z.zone_description = trim(s.zone)) "
+                "AND s.zone_ref_id IS DISTINCT FROM z.id "
+                "RETURNING z.id"
+            )
+            affected = {zone_id for (zone_id,) in cursor.fetchall()}
+            self.recount(affected)
+        return affected
+
+    def recount(self, zone_ids=None):
+        """
+        Recompute `Zone.store_count` of the given zones (all by default)
+        through the `zone_ref` index.
+        """
+        zones = cm.Zone.objects.all()
+        if zone_ids is not None:
+            zones = zones.filter(id__in=list(zone_ids))
+        counts = (
+            self.model.objects.filter(zone_ref=OuterRef("pk"))
+            .values("zone_ref")
+            .annotate(n=Count("id"))
+            .values("n")
+        )
+        return zones.update(store_count=Coalesce(Subquery(counts[:1]), 0))
+
+    def realign(self, assignments):
+        """
+        Move stores to new zones, given as a dict of store id to Zone id, and
+        add stores not mapped yet. Only the zones a store left or joined are
+        recounted. Returns the ids of those zones.
+        """
+        table = qn(self.model._meta.db_table)
+        zones = qn(cm.Zone._meta.db_table)
+        staging = qn(STAGING_TABLE)
+        with transaction.atomic(), connection.cursor() as cursor:
+            create_staging_table(
+                cursor,
+                STAGING_TABLE,
+                self.model._meta.db_table,
+                ["store_id", "zone_ref_id"],
+            )
+            copy_rows(
+                cursor, STAGING_TABLE, ["store_id", "zone_ref_id"], assignments.items()
+            )
+            cursor.execute(
+                f"WITH moved AS (SELECT s.id, s.zone_ref_id AS old_zone_id "
+                f"FROM {table} s JOIN {staging} n ON n.store_id = s.store_id "
+                "WHERE s.zone_ref_id IS DISTINCT FROM n.zone_ref_id FOR UPDATE) "
+                f"UPDATE {table} s SET zone_ref_id = n.zone_ref_id, "
+                "zone = z.zone_code::text "
+                f"FROM moved m, {staging} n, {zones} z "
+                "WHERE s.id = m.id AND n.store_id = s.store_id "
+                "AND z.id = n.zone_ref_id "
+                "RETURNING m.old_zone_id, s.zone_ref_id"
+            )
+            affected = {z for row in cursor.fetchall() for z in row if z is not None}
+            cursor.execute(
+                f"INSERT INTO {table} (store_id, zone, zone_ref_id) "
+                f"SELECT n.store_id, z.zone_code::text, n.zone_ref_id "
+                f"FROM {staging} n JOIN {zones} z ON z.id = n.zone_ref_id "
+                f"WHERE NOT EXISTS (SELECT 1 FROM {table} s "
+                "WHERE s.store_id = n.store_id) RETURNING zone_ref_id"
+            )
+            affected.update(zone_id for (zone_id,) in cursor.fetchall())
+            if affected:
+                self.recount(affected)
+                ReferenceDataVersion.objects.bump("zone")
+        return affected
 
 
 class StoreZone(models.Model):
+    objects = StoreZoneQuerySet.as_manager()
 
     store_id = models.IntegerField()
     zone = models.CharField(max_length=20)
+    # Zone matching `zone` by code or description; set on save.
+    zone_ref = models.ForeignKey(
+        "core.Zone",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="stores",
+    )
+
+    class Meta:
+        indexes = [models.Index(fields=["store_id"])]
+
+    def save(self, *args, **kwargs):
+        zone = zone_for(self.zone)
+        self.zone_ref_id = zone.id if zone is not None else None
+        super().save(*args, **kwargs)
+
+
+class StoreZoneIndex:
+    """Immutable store id -> Zone id map"""
+
+    def __init__(self, versions):
+        self.versions = versions
+        self.zones = dict(
+            StoreZone.objects.filter(zone_ref__isnull=False).values_list(
+                "store_id", "zone_ref_id"
+            )
+        )
+
+
+class StoreZoneCache:
+    """
+    Process-level cache of `StoreZoneIndex`, reloaded when the "zone"
+    `ReferenceDataVersion` changes, checked at most every `check_interval`
+    seconds.
+    """
+
+    def __init__(self, check_interval=5):
+        self.check_interval = check_interval
+        self._index = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        if self._index is not None and now - self._checked_at < self.check_interval:
+            return self._index
+        with self._lock:
+            versions = ReferenceDataVersion.objects.current("zone")
+            if self._index is None or self._index.versions != versions:
+                self._index = StoreZoneIndex(versions)
+            self._checked_at = now
+            return self._index
+
+    def invalidate(self):
+        with self._lock:
+            self._index = None
+
+
+store_zones = StoreZoneCache()
+
+
+def _adjust_store_count(zone_id, delta):
+    if zone_id is not None:
+        cm.Zone.objects.filter(id=zone_id).update(
+            store_count=F("store_count") + delta
+        )
+
+
+def _remember_zone(sender, instance, raw=False, **kwargs):
+    instance._previous_zone_ref_id = None
+    if instance.pk is not None and not raw:
+        instance._previous_zone_ref_id = (
+            StoreZone.objects.filter(pk=instance.pk)
+            .values_list("zone_ref_id", flat=True)
+            .first()
+        )
+
+
+def _count_saved_store(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_previous_zone_ref_id", None)
+    if created or previous != instance.zone_ref_id:
+        _adjust_store_count(previous, -1)
+        _adjust_store_count(instance.zone_ref_id, 1)
+
+
+def _count_deleted_store(sender, instance, **kwargs):
+    _adjust_store_count(instance.zone_ref_id, -1)
+
+
+pre_save.connect(_remember_zone, sender=StoreZone)
+post_save.connect(_count_saved_store, sender=StoreZone)
+post_delete.connect(_count_deleted_store, sender=StoreZone)
@@ -0,0 +1,135 @@
+import threading
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TransactionTestCase
+from django.utils import timezone
+
+from core import models as cm
+
+
+class ScenarioRunQueueTests(TransactionTestCase):
+    """
+    Committed transactions are needed for concurrent workers to see each
+    other's claims, hence `TransactionTestCase`.
+    """
+
+    def queue(self, event, count, priority=0):
+        return [
+            cm.ScenarioRun.objects.submit(
+                cm.MarkdownScenario.objects.create(event=event), priority=priority
+            )
+            for _ in range(count)
+        ]
+
+    def test_claim_highest_priority_first(self):
+        event = cm.MarkdownEvent.objects.create(name="event")
+        low = self.queue(event, 2)
+        high = self.queue(event, 2, priority=5)
+
+        claimed = cm.ScenarioRun.objects.claim("worker", 3)
+
+        self.assertEqual(
+            [run.id for run in claimed], [high[0].id, high[1].id, low[0].id]
+        )
+        for run in claimed:
+            run.refresh_from_db()
+            self.assertEqual(run.status, cm.ScenarioRunStatus.RUNNING)
+            self.assertEqual(run.worker, "worker")
+            self.assertEqual(run.attempts, 1)
+        self.assertEqual(cm.ScenarioRun.objects.claim("other", 3)[0].id, low[1].id)
+
+    def test_claim_respects_event_concurrency(self):
+        event = cm.MarkdownEvent.objects.create(name="event")
+        self.queue(event, 3)
+
+        self.assertEqual(len(cm.ScenarioRun.objects.claim("worker", 3, 2)), 2)
+        self.assertEqual(cm.ScenarioRun.objects.claim("worker", 3, 2), [])
+
+    def test_saturated_event_does_not_starve_others(self):
+        busy = cm.MarkdownEvent.objects.create(name="busy")
+        idle = cm.MarkdownEvent.objects.create(name="idle")
+        self.queue(busy, 10, priority=5)
+        (waiting,) = self.queue(idle, 1)
+
+        claimed = cm.ScenarioRun.objects.claim("worker", 2, event_concurrency=1)
+
+        self.assertEqual([run.event_id for run in claimed], [busy.id, idle.id])
+        self.assertEqual(claimed[1].id, waiting.id)
+
+    def test_concurrent_claims_share_event_slots(self):
+        event = cm.MarkdownEvent.objects.create(name="event")
+        self.queue(event, 10)
+        barrier = threading.Barrier(4)
+        claimed, errors = [], []
+
+        def work(name):
+            try:
+                barrier.wait()
+                claimed.extend(cm.ScenarioRun.objects.claim(name, 5, 2))
+            except Exception as e:  # surfaced by the assertion below
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=work, args=(f"w{i}",)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len({run.id for run in claimed}), len(claimed))
+        self.assertLessEqual(len(claimed), 2)
+        self.assertEqual(
+            cm.ScenarioRun.objects.filter(status=cm.ScenarioRunStatus.RUNNING).count(),
+            len(claimed),
+        )
+
+    def test_reap_times_out_stale_runs(self):
+        event = cm.MarkdownEvent.objects.create(name="event")
+        stale, fresh = self.queue(event, 2)
+        cm.ScenarioRun.objects.claim("worker", 2)
+        cm.ScenarioRun.objects.filter(id=stale.id).update(
+            heartbeat_at=timezone.now() - timedelta(hours=1)
+        )
+
+        reaped = cm.ScenarioRun.objects.reap(timedelta(minutes=30))
+
+        self.assertEqual([run.id for run in reaped], [stale.id])
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, cm.ScenarioRunStatus.TIMEOUT)
+        stale.markdown_scenario.refresh_from_db()
+        self.assertEqual(stale.markdown_scenario.status, cm.ScenarioRunStatus.TIMEOUT)
+        # A reaped run keeps its status when the worker reports back late.
+        self.assertFalse(
+            cm.ScenarioRun.objects.finish(stale, cm.ScenarioRunStatus.DONE)
+        )
+        self.assertTrue(cm.ScenarioRun.objects.finish(fresh, cm.ScenarioRunStatus.DONE))
+
+    def test_scheduler_drains_queue(self):
+        event = cm.MarkdownEvent.objects.create(name="event")
+        runs = self.queue(event, 3)
+        runner = cm.FakeOptimizerRunner()
+        scheduler = cm.ScenarioScheduler(runner, workers=2, event_concurrency=1)
+
+        scheduler.drain()
+        scheduler.executor.shutdown(wait=True)
+
+        self.assertEqual(sorted(runner.runs), [run.id for run in runs])
+        self.assertEqual(
+            set(cm.ScenarioRun.objects.values_list("status", flat=True).distinct()),
+            {cm.ScenarioRunStatus.DONE},
+        )
+
+    def test_scheduler_marks_failed_runs(self):
+        event = cm.MarkdownEvent.objects.create(name="event")
+        (run,) = self.queue(event, 1)
+        scheduler = cm.ScenarioScheduler(cm.FakeOptimizerRunner(fail=True))
+
+        scheduler.drain()
+        scheduler.executor.shutdown(wait=True)
+
+        run.refresh_from_db()
+        self.assertEqual(run.status, cm.ScenarioRunStatus.FAILED)
+        self.assertEqual(run.error, "Fake optimizer failure")